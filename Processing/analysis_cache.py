@@ -0,0 +1,191 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+def approx_size(value, _depth=0):
+    """Rough deep size in bytes of plain Python data (str, list, dict, ...)"""
+    size = sys.getsizeof(value)
+    if _depth > 4:
+        return size
+    if isinstance(value, dict):
+        size += sum(approx_size(k, _depth + 1) + approx_size(v, _depth + 1)
+                    for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(approx_size(item, _depth + 1) for item in value)
+    return size
+
+
+class AnalysisCache:
+    """Thread-safe LRU cache with optional TTL and byte budget.
+
+    Entries are evicted least recently used first once there are more than
+    ``maxsize`` of them or their estimated size exceeds ``max_bytes``.
+    Entries older than ``ttl`` seconds are treated as misses. Entries can
+    carry tags so that everything derived from one fact can be dropped with
+    ``invalidate_tag``. A value computed while one of its tags was
+    invalidated (or the cache cleared) is not stored, since it may have
+    been computed from what the invalidation replaced. Hits, misses,
+    evictions, expirations and invalidations are counted for ``stats()``.
+    """
+
+    def __init__(self, maxsize=1000, ttl=None, max_bytes=None, sizeof=approx_size):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (value, stored at, size, tags)
+        self._tags = {}  # tag -> set of keys
+        self._tag_generations = {}  # tag -> times invalidated
+        self._clears = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, stored_at = entry[0], entry[1]
+            if self.ttl is not None and time.monotonic() - stored_at > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self, tags=()):
+        """Token that changes whenever any of tags is invalidated; pass it to set()"""
+        with self._lock:
+            return self._generation(tuple(tags))
+
+    def set(self, key, value, tags=(), generation=None):
+        """Store value under key, evicting old entries if over budget.
+
+        With ``generation`` from ``generation(tags)`` taken before value was
+        computed, nothing is stored (and False returned) if a tag has been
+        invalidated since.
+        """
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        tags = tuple(tags)
+        with self._lock:
+            if generation is not None and generation != self._generation(tags):
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic(), size, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            self._bytes += size
+            self._evict()
+            return True
+
+    def get_or_compute(self, key, compute, tags=()):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            tags = tuple(tags)
+            generation = self.generation(tags)
+            value = compute()
+            self.set(key, value, tags, generation)
+        return value
+
+    def invalidate(self, key):
+        """Drop one entry; returns True if it was cached"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                return True
+            return False
+
+    def invalidate_tag(self, tag):
+        """Drop every entry stored with tag; returns how many were dropped"""
+        with self._lock:
+            # Counted even with nothing stored yet: a value may be computing
+            self._tag_generations[tag] = self._tag_generations.get(tag, 0) + 1
+            keys = self._tags.pop(tag, ())
+            for key in keys:
+                if key in self._entries:
+                    self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """Drop every entry, keeping the counters"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._clears += 1
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def empty_copy(self):
+        """A new, empty cache with the same limits"""
+        return AnalysisCache(self.maxsize, self.ttl, self.max_bytes, self.sizeof)
+
+    def stats(self):
+        """Counters and current footprint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl
+            }
+
+    def _generation(self, tags):
+        return self._clears, tuple(self._tag_generations.get(tag, 0) for tag in tags)
+
+    def _remove(self, key):
+        _, _, size, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _evict(self):
+        while self._entries and (
+            (self.maxsize is not None and len(self._entries) > self.maxsize)
+            or (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache():
+    """Process-wide cache for callers that want to share results"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = AnalysisCache()
+        return _shared_cache
@@ -0,0 +1,189 @@
+import itertools
+import json
+import os
+import re
+import threading
+from collections import defaultdict
+
+from Processing.command_matcher import CommandMatcher
+from Processing.keyword_automaton import KeywordAutomaton, PhraseTrie
+from Processing.spelling_index import SpellingIndex
+
+# Grammar shipped with the package
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "command_grammar.json")
+
+# Process-wide, so a version is never reused by another grammar
+_versions = itertools.count(1)
+
+# Politeness and addressing words that may surround a command without
+# changing what it asks for. Nothing that can make a statement out of one:
+# "i want to sleep" is not the sleep command.
+COMMAND_FILLERS = frozenset({'please', 'hey', 'ash', 'ok', 'okay', 'thanks'})
+
+
+def phrase_key(text):
+    """Lowercased words of text without punctuation or filler words"""
+    words = re.findall(r"[a-z0-9']+", text.lower())
+    return ' '.join(word for word in words if word not in COMMAND_FILLERS)
+
+
+class CommandGrammar:
+    """Command phrases and aliases with every lookup structure built from them.
+
+    A grammar is immutable once compiled. NLPProcessor swaps in a new one
+    with a single attribute assignment, and a classification reads the
+    grammar once at the start, so requests in flight during a reload
+    finish against the version they started with.
+    """
+
+    def __init__(self, system_commands, aliases=None, source=None):
+        self.system_commands = {
+            category: list(commands) for category, commands in system_commands.items()
+        }
+        self.aliases = {
+            category: dict(category_aliases)
+            for category, category_aliases in (aliases or {}).items()
+        }
+        self.source = source
+        self.version = next(_versions)
+        self.app_verbs = frozenset(self.system_commands.get('app', ()))
+        self._validate()
+
+    @classmethod
+    def load(cls, path=GRAMMAR_FILE):
+        """Read a grammar file: {"categories": {name: {"phrases": [...], "aliases": {...}}}}"""
+        with open(path, "r") as f:
+            data = json.load(f)
+        categories = data.get("categories")
+        if not isinstance(categories, dict) or not all(
+                isinstance(spec, dict) for spec in categories.values()):
+            raise ValueError(f"{path}: expected a 'categories' object of objects")
+        return cls(
+            {name: spec.get("phrases", []) for name, spec in categories.items()},
+            {name: spec.get("aliases", {}) for name, spec in categories.items()},
+            source=path
+        )
+
+    def _validate(self):
+        for category, commands in self.system_commands.items():
+            if not all(isinstance(cmd, str) and cmd.strip() for cmd in commands):
+                raise ValueError(f"Category {category!r} has an empty or non-string phrase")
+        for category, category_aliases in self.aliases.items():
+            phrases = set(self.system_commands.get(category, ()))
+            for alias, cmd in category_aliases.items():
+                if cmd not in phrases:
+                    raise ValueError(
+                        f"Alias {alias!r} points to {cmd!r}, which is not a {category!r} phrase"
+                    )
+
+    def words(self):
+        """Every word of every phrase and alias, in table order"""
+        words = []
+        for commands in self.system_commands.values():
+            for cmd in commands:
+                words.extend(cmd.lower().split())
+        for category_aliases in self.aliases.values():
+            for alias in category_aliases:
+                words.extend(alias.lower().split())
+        return words
+
+    def compile(self, matcher_class=CommandMatcher, spelling_index_file=None,
+                spelling_words=None):
+        """Build the matcher, automaton, trie and indices; returns self"""
+        self.matcher = matcher_class(self.system_commands, self.aliases)
+        entries = self.matcher.entries
+
+        # Every phrase in one automaton for substring checks
+        self.automaton = KeywordAutomaton(
+            (match_text, (category, cmd)) for category, cmd, match_text in entries
+        )
+
+        # Word trie of the phrases for incremental (streaming) classification
+        self.trie = PhraseTrie(entries)
+
+        # Phrase with fillers and punctuation removed -> (category, cmd).
+        # Keys shared by phrases of different categories are left out, so a
+        # hit is never ambiguous.
+        exact = {}
+        for category, cmd, match_text in entries:
+            key = phrase_key(match_text)
+            if key and exact.setdefault(key, (category, cmd))[0] != category:
+                exact[key] = None
+        self.exact = {key: value for key, value in exact.items() if value is not None}
+
+        # Word -> phrase indices (table order) for partial-match suggestions
+        token_index = defaultdict(list)
+        for idx, (_, _, match_text) in enumerate(entries):
+            for token in set(match_text.split()):
+                token_index[token].append(idx)
+        self.token_index = dict(token_index)
+
+        # Symmetric-delete index over the command vocabulary, saved to disk
+        self.spelling_index = SpellingIndex.load_or_build(
+            spelling_index_file,
+            spelling_words if spelling_words is not None else self.words()
+        )
+        return self
+
+    def exact_match(self, text):
+        """(category, cmd) of the phrase text says, give or take fillers, or None"""
+        return self.exact.get(phrase_key(text))
+
+    def __len__(self):
+        return len(self.matcher.entries)
+
+
+class GrammarWatcher:
+    """Polls a grammar file and reloads the processor when it changes.
+
+    A file that fails to load is reported and skipped; the processor keeps
+    its current grammar until a valid version is saved.
+    """
+
+    def __init__(self, nlp, path=None, interval=2.0, on_reload=None):
+        """on_reload: called with the new grammar after each successful reload"""
+        self.nlp = nlp
+        self.path = path or nlp.grammar_file
+        self.interval = interval
+        self.on_reload = on_reload
+        self._stop = threading.Event()
+        self._thread = None
+        self._signature = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def check(self):
+        """Reload if the file changed since the last check; returns the new grammar or None"""
+        signature = self._stat()
+        if signature is None or signature == self._signature:
+            return None
+        self._signature = signature
+        try:
+            grammar = self.nlp.reload_grammar(self.path)
+        except (OSError, ValueError) as e:
+            print(f"Keeping grammar version {self.nlp.grammar.version}: {e}")
+            return None
+        if self.on_reload is not None:
+            self.on_reload(grammar)
+        return grammar
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
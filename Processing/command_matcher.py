@@ -0,0 +1,94 @@
+import difflib
+from collections import Counter, defaultdict
+
+
+def command_entries(system_commands, aliases=None):
+    """(category, command, lowercased text to match) for every phrase.
+
+    Phrases come in table order, followed by aliases, which match their own
+    text but report the command they stand for.
+    """
+    entries = []
+    for category, commands in system_commands.items():
+        for cmd in commands:
+            entries.append((category, cmd, cmd.lower()))
+    for category, category_aliases in (aliases or {}).items():
+        for alias, cmd in category_aliases.items():
+            entries.append((category, cmd, alias.lower()))
+    return entries
+
+
+class CommandMatcher:
+    """Compiled matcher over the system command phrases.
+
+    The phrases are indexed once by character. For an utterance, the index
+    gives every phrase an upper bound on its ``SequenceMatcher.ratio()``
+    (the same bound as ``quick_ratio``), and only phrases whose bound can
+    still beat the best score so far are scored exactly. The result is
+    identical to scoring every phrase in table order and keeping the first
+    strictly-best one.
+    """
+
+    def __init__(self, system_commands, aliases=None):
+        """aliases: {category: {alias: command}}, matched like extra phrases"""
+        self.entries = command_entries(system_commands, aliases)
+        self.char_index = defaultdict(list)  # char -> [(entry index, count)]
+
+        for idx, (_, _, cmd_lower) in enumerate(self.entries):
+            for char, count in Counter(cmd_lower).items():
+                self.char_index[char].append((idx, count))
+
+        self.char_index = dict(self.char_index)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _candidates(self, text_lower):
+        """Return (negated bound, entry index) pairs, best bound first"""
+        overlap = defaultdict(int)
+        for char, count in Counter(text_lower).items():
+            for idx, cmd_count in self.char_index.get(char, ()):
+                overlap[idx] += count if count < cmd_count else cmd_count
+
+        text_len = len(text_lower)
+        candidates = [
+            (-(2.0 * matches / (len(self.entries[idx][2]) + text_len)), idx)
+            for idx, matches in overlap.items()
+        ]
+        candidates.sort()
+        return candidates
+
+    def best_match(self, text):
+        """Return (category, command, score) of the best phrase for text.
+
+        Category and command are None when nothing shares a character with
+        the input, matching the score of 0 the linear scan would report.
+        """
+        text_lower = text.lower()
+        matcher = difflib.SequenceMatcher(None, '', text_lower)
+
+        best_score = 0
+        best_idx = None
+        for neg_bound, idx in self._candidates(text_lower):
+            bound = -neg_bound
+            # Remaining phrases can at most tie, and a tie only wins if the
+            # phrase comes earlier in the table than the current best.
+            if bound < best_score or (bound == best_score and idx > best_idx):
+                break
+
+            matcher.set_seq1(self.entries[idx][2])
+            score = matcher.ratio()
+            if score > best_score or (
+                score == best_score and best_idx is not None and idx < best_idx
+            ):
+                best_score = score
+                best_idx = idx
+
+        if best_idx is None:
+            return None, None, 0
+        category, command, _ = self.entries[best_idx]
+        return category, command, best_score
+
+    def best_match_batch(self, texts):
+        """best_match for each of texts"""
+        return [self.best_match(text) for text in texts]
@@ -1,67 +1,371 @@
-import subprocess
+import hashlib
 import json
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import nullcontext
 from typing import Optional, Dict, List
+from Processing.analysis_cache import AnalysisCache
+from Processing.response_cache import ResponseCache
+from Processing.ollama_client import OllamaError, client_from_env
+from Processing import metrics
+
+# Histogram of time spent in each stage of generate_response
+GENERATION_METRIC = 'ash_generation_stage_seconds'
+
+# Lines the model sometimes echoes from the prompt format
+ARTIFACT_PREFIXES = ('Human:', 'Assistant:', 'System:')
+# Removed one after the other, in this order, like _format_response does
+SYSTEM_MARKERS = ('<<SYS>>', '<</SYS>>')
+
+# Instructions in front of every prompt
+SYSTEM_PROMPT = (
+    "<<SYS>>\n"
+    "You are Ash, an advanced AI assistant created by Adarsh Shah. Follow these guidelines:\n"
+    "1. Keep responses concise and direct by default\n"
+    "2. Use a confident, professional tone with a touch of personality\n"
+    "3. Address the user as 'Sir' occasionally\n"
+    "4. Response style:\n"
+    "   - Default: Short, clear answers\n"
+    "   - Only provide detailed explanations when specifically asked\n"
+    "   - Use technical terms only when relevant\n"
+    "   - Add subtle wit when appropriate\n"
+    "5. When handling technical tasks:\n"
+    "   - Confirm actions before execution\n"
+    "   - Provide status updates\n"
+    "   - Prioritize efficiency and security\n"
+    "<</SYS>>\n\n"
+)
+
+# Instructions for each kind of generation request, put before the query
+QUERY_PROMPTS = {
+    'code': (
+        "Write code for this request. Include:\n"
+        "1. Implementation\n"
+        "2. Comments explaining the code\n"
+        "3. Example usage\n"
+    ),
+    'explanation': (
+        "Explain this concept. Include:\n"
+        "1. Simple explanation\n"
+        "2. Key points\n"
+        "3. Examples if relevant\n"
+    ),
+    'general': "Provide a clear and helpful response to this query:\n"
+}
+
+# Where a sentence ends in streamed text
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\n+')
+
+
+def template_id(query_type):
+    """Short id of the instructions a query type is answered with.
+
+    Part of the response cache key, so editing a prompt retires the
+    answers generated with the old one.
+    """
+    prefix = QUERY_PROMPTS.get(query_type, QUERY_PROMPTS['general'])
+    return hashlib.blake2b((SYSTEM_PROMPT + prefix).encode('utf-8'), digest_size=6).hexdigest()
+
+
+class ResponseFormatter:
+    """Incremental version of GenerationHandler._format_response.
+
+    ``feed`` takes the model output piece by piece and returns the cleaned
+    text that is final so far; ``finish`` flushes the rest. Text is held
+    back only while it could still turn out to be a prompt artifact (the
+    start of a line, a partial <<SYS>> marker or trailing whitespace).
+    """
 
-class GenerationHandler:
     def __init__(self):
+        self.marker_buffers = [''] * len(SYSTEM_MARKERS)  # raw text per marker
+        self.line = ''  # start of the current line, kept or dropped once known
+        self.mode = 'start'  # 'start', 'keep' or 'drop'
+        self.pending_space = ''
+        self.emitted = False
+
+    def feed(self, text):
+        for i in range(len(SYSTEM_MARKERS)):
+            text = self._strip_marker(i, text)
+        return self._lines(text)
+
+    def finish(self):
+        text = ''
+        for i in range(len(SYSTEM_MARKERS)):
+            # What one marker held back still goes through the next
+            text = self._strip_marker(i, text) + self.marker_buffers[i]
+            self.marker_buffers[i] = ''
+        out = self._lines(text)
+        if self.mode == 'start' and self.line:
+            out += self._keep(self.line)
+        self.line = ''
+        self.mode = 'start'
+        return out
+
+    def _strip_marker(self, i, text):
+        """Remove one marker from the stream the way str.replace would.
+
+        The held back tail stays unreplaced, so a marker is never formed
+        by joining the text around one already removed.
+        """
+        marker = SYSTEM_MARKERS[i]
+        parts = (self.marker_buffers[i] + text).split(marker)
+        # Hold back a tail that may be the start of a marker
+        tail = parts[-1]
+        hold = 0
+        for size in range(min(len(marker) - 1, len(tail)), 0, -1):
+            if tail.endswith(marker[:size]):
+                hold = size
+                break
+        self.marker_buffers[i] = tail[len(tail) - hold:]
+        text = ''.join(parts)
+        return text[:len(text) - hold]
+
+    def _keep(self, text):
+        content = text.rstrip()
+        self.pending_space = text[len(content):]
+        out = ('\n' if self.emitted else '') + content
+        self.emitted = True
+        self.mode = 'keep'
+        return out
+
+    def _lines(self, text):
+        out = []
+        for char in text:
+            if char == '\n':
+                if self.mode == 'start' and self.line:
+                    # A short line that never grew past an artifact prefix
+                    out.append(self._keep(self.line))
+                self.line = ''
+                self.mode = 'start'
+                self.pending_space = ''
+            elif self.mode == 'keep':
+                if char.isspace():
+                    self.pending_space += char
+                else:
+                    out.append(self.pending_space + char)
+                    self.pending_space = ''
+            elif self.mode == 'start':
+                if not self.line and char.isspace():
+                    continue
+                self.line += char
+                if self.line.startswith(ARTIFACT_PREFIXES):
+                    self.mode = 'drop'
+                elif not any(prefix.startswith(self.line) for prefix in ARTIFACT_PREFIXES):
+                    out.append(self._keep(self.line))
+        return ''.join(out)
+
+
+def iter_sentences(chunks):
+    """Regroup streamed text chunks into whole sentences as soon as each ends"""
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        parts = SENTENCE_BREAK.split(buffer)
+        buffer = parts.pop()
+        for sentence in parts:
+            if sentence.strip():
+                yield sentence.strip()
+    if buffer.strip():
+        yield buffer.strip()
+
+
+class Conversation:
+    """State of one chat, so each turn only sends the model what is new.
+
+    After every answer Ollama returns ``context``: the tokens of the chat so
+    far, already evaluated. The next turn sends those with just the new
+    question, so prefill per turn stays flat however long the chat gets.
+    Without tokens (the CLI backend, a cached answer, or a chat that outgrew
+    ``max_context_tokens``) the turn is sent after a text transcript of the
+    last ``max_turns`` turns, each serialized once when it happened.
+    """
+
+    def __init__(self, max_turns: int = 5, max_context_tokens: int = 4096):
+        self.turns = deque(maxlen=max_turns)
+        self.tokens = None
+        self.max_context_tokens = max_context_tokens
+        self.lock = threading.Lock()  # one turn at a time
+
+    @property
+    def started(self) -> bool:
+        return bool(self.turns)
+
+    def turn_text(self, query: str, context: Optional[Dict] = None) -> str:
+        text = f"Human: {query}\n"
+        if context:
+            text += f"Context: {json.dumps(context)}\n"
+        return text + "\nAssistant: "
+
+    def request(self, turn: str):
+        """(prompt, system, context tokens) to send for the next turn"""
+        if self.tokens:
+            # The system prompt and earlier turns are already in the tokens
+            return turn, None, self.tokens
+        return ''.join(self.turns) + turn, SYSTEM_PROMPT, None
+
+    def record(self, turn: str, answer: str, tokens: Optional[List[int]] = None):
+        self.turns.append(f"{turn}{answer}\n\n")
+        # Past the limit, start over from the transcript on the next turn
+        if tokens and len(tokens) <= self.max_context_tokens:
+            self.tokens = tokens
+        else:
+            self.tokens = None
+
+
+class GenerationHandler:
+    def __init__(self, cache: Optional[AnalysisCache] = None, client=None,
+                 model: str = "llama3.2",
+                 response_cache: Optional[ResponseCache] = None,
+                 max_conversations: int = 100):
         """
         Initialize the generation handler with llama3.2 model
+
+        cache: optional AnalysisCache used to reuse formatted prompts
+        client: OllamaClient or OllamaCLI; by default chosen by client_from_env
+        response_cache: optional ResponseCache of answers to specific queries
+        max_conversations: conversations kept, least recently used dropped first
         """
-        self.model = "llama3.2"
+        self.model = model
+        self.client = client or client_from_env(model)
+        self.response_cache = response_cache
         self.context_history = []
+        self._history_text = []  # context_history items, serialized once each
         self.max_context_length = 5
+        self.cache = cache
+        self._cache_namespace = uuid.uuid4().hex
+        self._history_version = 0
+        self.conversations = OrderedDict()
+        self.max_conversations = max_conversations
+        self._conversations_lock = threading.Lock()
+
+    def conversation(self, conversation_id: str) -> Conversation:
+        """The state of a conversation, started on first use"""
+        with self._conversations_lock:
+            conversation = self.conversations.pop(conversation_id, None) or Conversation(
+                max_turns=self.max_context_length
+            )
+            self.conversations[conversation_id] = conversation
+            while len(self.conversations) > self.max_conversations:
+                self.conversations.popitem(last=False)
+            return conversation
+
+    def end_conversation(self, conversation_id: str):
+        with self._conversations_lock:
+            self.conversations.pop(conversation_id, None)
+
+    def generate_response(self, query: str, context: Optional[Dict] = None,
+                          conversation: Optional[str] = None) -> str:
+        """Generate a response for the given query using llama3.2.
+
+        Within a conversation (any id chosen by the caller) each turn builds
+        on the model state left by the previous one.
+        """
+        chat = self.conversation(conversation) if conversation is not None else None
+        with chat.lock if chat is not None else nullcontext():
+            try:
+                return self._generate(query, context, chat)
+            except Exception as e:
+                return self._error_message(e)
+
+    def stream_response(self, query: str, context: Optional[Dict] = None,
+                        conversation: Optional[str] = None):
+        """Yield the formatted response to query piece by piece as the model writes it"""
+        chat = self.conversation(conversation) if conversation is not None else None
+        with chat.lock if chat is not None else nullcontext():
+            try:
+                yield from self._stream(query, context, chat)
+            except Exception as e:
+                yield self._error_message(e)
+
+    def _request(self, query: str, context: Optional[Dict], chat: Optional[Conversation]):
+        """(prompt, system, context tokens, turn text) for one generation"""
+        with metrics.timer(GENERATION_METRIC, stage='prompt'):
+            if chat is None:
+                self._remember(query, context)
+                return self._get_prompt(query), SYSTEM_PROMPT, None, None
+            turn = chat.turn_text(query, context)
+            return chat.request(turn) + (turn,)
+
+    def _generate(self, query: str, context: Optional[Dict],
+                  chat: Optional[Conversation] = None) -> str:
+        prompt, system, tokens, turn = self._request(query, context, chat)
+        with metrics.timer(GENERATION_METRIC, stage='model'):
+            result = self.client.generate(prompt, model=self.model, system=system,
+                                          context=tokens)
+        
+        with metrics.timer(GENERATION_METRIC, stage='format'):
+            response = self._format_response(result.get('response', '').strip())
+        if chat is not None:
+            chat.record(turn, response, result.get('context'))
+        return response
+
+    def _stream(self, query: str, context: Optional[Dict],
+                chat: Optional[Conversation] = None):
+        prompt, system, tokens, turn = self._request(query, context, chat)
+        formatter = ResponseFormatter()
+        start = time.perf_counter()
+        first = True
+        parts = []
+        final = {}
+        for chunk in self.client.generate_stream(prompt, model=self.model, system=system,
+                                                 context=tokens):
+            if chunk.get('done'):
+                final = chunk
+            text = formatter.feed(chunk.get('response', ''))
+            if text:
+                if first:
+                    metrics.registry.observe(GENERATION_METRIC, time.perf_counter() - start,
+                                             stage='first_token')
+                    first = False
+                parts.append(text)
+                yield text
+        tail = formatter.finish()
+        if tail:
+            parts.append(tail)
+            yield tail
+        metrics.registry.observe(GENERATION_METRIC, time.perf_counter() - start,
+                                 stage='model')
+        if chat is not None:
+            chat.record(turn, ''.join(parts), final.get('context'))
 
-    def generate_response(self, query: str, context: Optional[Dict] = None) -> str:
-        """Generate a response for the given query using llama3.2"""
-        try:
-            # Add context to history
-            if context:
-                self.context_history.append({"query": query, "context": context})
-                if len(self.context_history) > self.max_context_length:
-                    self.context_history.pop(0)
-
-            prompt = self._format_prompt(query)
-            cmd = ["ollama", "run", "llama3.2", prompt]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                return self._format_response(result.stdout.strip())
-            else:
-                return f"Error generating response: {result.stderr}"
-
-        except Exception as e:
-            return f"Failed to generate response: {str(e)}"
+    def _error_message(self, error: Exception) -> str:
+        if isinstance(error, OllamaError):
+            return f"Error generating response: {error}"
+        return f"Failed to generate response: {str(error)}"
+
+    def _remember(self, query: str, context: Optional[Dict]):
+        """Add context to history"""
+        if context:
+            self.context_history.append({"query": query, "context": context})
+            self._history_text.append(
+                f"Human: {query}\nContext: {json.dumps(context)}\n"
+            )
+            if len(self.context_history) > self.max_context_length:
+                self.context_history.pop(0)
+                self._history_text.pop(0)
+            self._history_version += 1
+
+    def _get_prompt(self, query: str) -> str:
+        """Formatted prompt for query, from the cache when one is configured"""
+        if self.cache is None:
+            return self._format_prompt(query)
+        # The history version changes whenever the context does
+        key = ('prompt', self._cache_namespace, self._history_version, query)
+        return self.cache.get_or_compute(key, lambda: self._format_prompt(query))
 
     def _format_prompt(self, query: str) -> str:
-        """Format the prompt with context history and system instructions"""
-        prompt = (
-            "<<SYS>>\n"
-            "You are Ash, an advanced AI assistant created by Adarsh Shah. Follow these guidelines:\n"
-            "1. Keep responses concise and direct by default\n"
-            "2. Use a confident, professional tone with a touch of personality\n"
-            "3. Address the user as 'Sir' occasionally\n"
-            "4. Response style:\n"
-            "   - Default: Short, clear answers\n"
-            "   - Only provide detailed explanations when specifically asked\n"
-            "   - Use technical terms only when relevant\n"
-            "   - Add subtle wit when appropriate\n"
-            "5. When handling technical tasks:\n"
-            "   - Confirm actions before execution\n"
-            "   - Provide status updates\n"
-            "   - Prioritize efficiency and security\n"
-            "<</SYS>>\n\n"
-        )
-
-        if self.context_history:
-            prompt += "Previous context:\n"
-            for item in self.context_history:
-                prompt += f"Human: {item['query']}\n"
-                if item['context']:
-                    prompt += f"Context: {json.dumps(item['context'])}\n"
-            prompt += "\n"
-
-        prompt += f"Human: {query}\n\nAssistant: "
-        return prompt
+        """Format the prompt with context history.
+
+        The system instructions go separately as SYSTEM_PROMPT, which never
+        changes, so the server can reuse its evaluation between requests.
+        """
+        prompt = ''
+        if self._history_text:
+            prompt = "Previous context:\n" + ''.join(self._history_text) + "\n"
+        return prompt + f"Human: {query}\n\nAssistant: "
 
     def _format_response(self, response: str) -> str:
         """Format the response for better readability"""
@@ -75,28 +379,92 @@ class GenerationHandler:
         ]
         return '\n'.join(cleaned_lines)
 
-    def handle_specific_queries(self, query_type: str, query: str) -> str:
-        """Handle specific types of queries"""
-        prompts = {
-            'code': (
-                "Write code for this request. Include:\n"
-                "1. Implementation\n"
-                "2. Comments explaining the code\n"
-                "3. Example usage\n"
-            ),
-            'explanation': (
-                "Explain this concept. Include:\n"
-                "1. Simple explanation\n"
-                "2. Key points\n"
-                "3. Examples if relevant\n"
-            ),
-            'general': "Provide a clear and helpful response to this query:\n"
-        }
-
-        prompt_prefix = prompts.get(query_type, prompts['general'])
-        formatted_query = f"{prompt_prefix}{query}"
-        return self.generate_response(formatted_query)
+    def handle_specific_queries(self, query_type: str, query: str,
+                                use_cache: bool = True,
+                                conversation: Optional[str] = None) -> str:
+        """Handle specific types of queries.
+
+        use_cache=False always asks the model, e.g. for questions whose
+        answer changes over time.
+        """
+        formatted_query = self._specific_query(query_type, query)
+        chat = self.conversation(conversation) if conversation is not None else None
+        with chat.lock if chat is not None else nullcontext():
+            if not self._cacheable(use_cache, chat):
+                try:
+                    return self._generate(formatted_query, None, chat)
+                except Exception as e:
+                    return self._error_message(e)
+
+            template = template_id(query_type)
+            cached = self.response_cache.get(self.model, template, query_type, query)
+            if cached is not None:
+                if chat is not None:
+                    chat.record(chat.turn_text(formatted_query), cached)
+                return cached
+
+            start = time.perf_counter()
+            try:
+                response = self._generate(formatted_query, None, chat)
+            except Exception as e:
+                return self._error_message(e)
+            if response:
+                self.response_cache.put(self.model, template, query_type, query, response,
+                                        time.perf_counter() - start)
+            return response
+
+    def stream_specific_queries(self, query_type: str, query: str, use_cache: bool = True,
+                                conversation: Optional[str] = None):
+        """handle_specific_queries, yielding the response as it is generated"""
+        formatted_query = self._specific_query(query_type, query)
+        chat = self.conversation(conversation) if conversation is not None else None
+        with chat.lock if chat is not None else nullcontext():
+            if not self._cacheable(use_cache, chat):
+                try:
+                    yield from self._stream(formatted_query, None, chat)
+                except Exception as e:
+                    yield self._error_message(e)
+                return
+
+            template = template_id(query_type)
+            cached = self.response_cache.get(self.model, template, query_type, query)
+            if cached is not None:
+                if chat is not None:
+                    chat.record(chat.turn_text(formatted_query), cached)
+                yield cached
+                return
+
+            start = time.perf_counter()
+            parts = []
+            try:
+                for text in self._stream(formatted_query, None, chat):
+                    parts.append(text)
+                    yield text
+            except Exception as e:
+                yield self._error_message(e)
+                return
+            # Only answers streamed to the end are stored
+            if parts:
+                self.response_cache.put(self.model, template, query_type, query,
+                                        ''.join(parts), time.perf_counter() - start)
+
+    def _cacheable(self, use_cache: bool, chat: Optional[Conversation] = None) -> bool:
+        """Whether an answer may come from (and go to) the response cache"""
+        if self.response_cache is None:
+            return False
+        # An answer shaped by earlier turns is not valid for anyone else
+        if not use_cache or self.context_history or (chat is not None and chat.started):
+            self.response_cache.bypass()
+            return False
+        return True
+
+    def _specific_query(self, query_type: str, query: str) -> str:
+        """Query with the instructions for its type in front"""
+        prompt_prefix = QUERY_PROMPTS.get(query_type, QUERY_PROMPTS['general'])
+        return f"{prompt_prefix}{query}"
 
     def clear_context(self):
         """Clear the context history"""
-        self.context_history = []
\ No newline at end of file
+        self.context_history = []
+        self._history_text = []
+        self._history_version += 1
\ No newline at end of file
@@ -0,0 +1,217 @@
+import math
+import queue
+import threading
+import time
+import uuid
+
+from Processing import metrics
+from Processing.generation_handler import GENERATION_METRIC
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class GenerationJob:
+    """One answer being generated; readers poll it or follow it as it is written"""
+
+    def __init__(self, query_type, query, conversation=None, use_cache=True):
+        self.id = uuid.uuid4().hex
+        self.query_type = query_type
+        self.query = query
+        self.conversation = conversation
+        self.use_cache = use_cache
+        self.status = QUEUED
+        self.parts = []
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED)
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+    def start(self):
+        with self._changed:
+            self.status = RUNNING
+            self.started = time.time()
+            self._changed.notify_all()
+
+    def append(self, text):
+        with self._changed:
+            self.parts.append(text)
+            self._changed.notify_all()
+
+    def finish(self, error=None):
+        with self._changed:
+            self.status = FAILED if error is not None else DONE
+            self.error = error
+            self.finished = time.time()
+            self._changed.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until the job is done; returns whether it is"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.done, timeout)
+
+    def follow(self, heartbeat=None):
+        """Yield the answer's pieces from the first as they are generated.
+
+        With ``heartbeat`` set, yields None whenever nothing arrived for that
+        many seconds so callers can keep an idle connection alive.
+        """
+        sent = 0
+        while True:
+            with self._changed:
+                self._changed.wait_for(lambda: len(self.parts) > sent or self.done, heartbeat)
+                new = self.parts[sent:]
+                done = self.done
+            if not new and not done:
+                yield None
+            for text in new:
+                yield text
+            sent += len(new)
+            if done and sent == len(self.parts):
+                return
+
+    def to_dict(self):
+        with self._changed:
+            data = {
+                'job': self.id,
+                'status': self.status,
+                'type': 'generation',
+                'intent': self.query_type,
+                'result': ''.join(self.parts)
+            }
+            if self.error is not None:
+                data['error'] = self.error
+            return data
+
+
+class GenerationQueue:
+    """Bounded queue of generation jobs run by a few worker threads.
+
+    At most ``workers`` model calls run at once, however many requests
+    arrive; up to ``max_queued`` more wait their turn, and ``submit`` raises
+    ``queue.Full`` beyond that so the server can tell clients to come back
+    later (``retry_after`` estimates when). Finished jobs stay readable for
+    ``keep_seconds``. Request threads only enqueue and read jobs, so they
+    are never tied up by the model and commands keep being answered while
+    answers are generated.
+    """
+
+    def __init__(self, generator, workers=2, max_queued=16, keep_seconds=300):
+        self.generator = generator
+        self.workers = workers
+        self.max_queued = max_queued
+        self.keep_seconds = keep_seconds
+        self.jobs = {}
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._mean_seconds = None  # moving average of job run time
+
+    def submit(self, query_type, query, conversation=None, use_cache=True):
+        """Queue a generation and return its job; raises queue.Full when saturated"""
+        job = GenerationJob(query_type, query, conversation, use_cache)
+        with self._lock:
+            self._start_workers()
+            self._prune()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self.rejected += 1
+                raise queue.Full(f"{self.max_queued} generations already queued") from None
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def retry_after(self):
+        """Seconds until a slot is likely to free up, for a Retry-After header"""
+        with self._lock:
+            mean = self._mean_seconds or 1.0
+            ahead = self._queue.qsize() + self.running
+        return max(1, math.ceil(mean * ahead / max(self.workers, 1)))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'running': self.running,
+                'queued': self._queue.qsize(),
+                'max_queued': self.max_queued,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'mean_seconds': round(self._mean_seconds or 0.0, 3)
+            }
+
+    def close(self):
+        """Stop the workers once the jobs already queued have run"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def _start_workers(self):
+        # Started on first use, so a process forked before any request
+        # never inherits them half-way through a job
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"generation-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _prune(self):
+        cutoff = time.time() - self.keep_seconds
+        stale = [job_id for job_id, job in self.jobs.items()
+                 if job.done and job.finished < cutoff]
+        for job_id in stale:
+            del self.jobs[job_id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                self.running += 1
+            metrics.registry.observe(GENERATION_METRIC, time.time() - job.created,
+                                     stage='queue_wait')
+            job.start()
+            error = None
+            try:
+                for text in self.generator.stream_specific_queries(
+                        job.query_type, job.query, use_cache=job.use_cache,
+                        conversation=job.conversation):
+                    job.append(text)
+            except Exception as e:
+                error = str(e)
+            job.finish(error)
+
+            seconds = job.finished - job.started
+            with self._lock:
+                self.running -= 1
+                if error is None:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+                self._mean_seconds = seconds if self._mean_seconds is None else \
+                    0.8 * self._mean_seconds + 0.2 * seconds
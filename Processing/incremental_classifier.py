@@ -0,0 +1,131 @@
+from Processing.command_grammar import COMMAND_FILLERS
+from Processing.nlp_processor import pattern_key
+
+# Words that end a command when said right after it. Anything else ("to",
+# "for", "and") may qualify it: "restart to install updates".
+COMMAND_TERMINATORS = frozenset({'please', 'now', 'thanks'})
+
+# The only categories decided before the utterance is finished: their
+# commands are easy to undo. "delete", "install" or "shutdown" always wait.
+EARLY_CATEGORIES = frozenset({'volume', 'media', 'brightness'})
+
+
+class IncrementalClassifier:
+    """Classifies a spoken command from transcript prefixes as they arrive.
+
+    ``feed`` takes the transcript so far (streaming recognizers resend the
+    whole partial result each time) and only processes words it has not
+    seen; if the recognizer revises an earlier word, the utterance is
+    rescanned. Matching walks a word trie of the command phrases from every
+    word position, so state carries over between calls.
+
+    A decision is made early only for an exact phrase from one reversible
+    category (volume, media, brightness), preceded by nothing but filler
+    words ("hey ash, mute"), and only once the phrase cannot be the start
+    of something else: "please", "now" or "thanks" follows it, or
+    ``stable_updates`` partial results in a row add no new words.
+    Everything else waits for ``finalize``, which falls back to the full
+    ``classify_input``.
+
+    The grammar is taken from the processor when the utterance starts, so a
+    grammar reloaded mid-utterance does not affect it.
+    """
+
+    def __init__(self, nlp, stable_updates=2):
+        self.nlp = nlp
+        self.stable_updates = stable_updates
+        self.reset()
+
+    def reset(self):
+        """Forget the current utterance"""
+        self.grammar = self.nlp.grammar
+        self.words = []  # words as heard
+        self.corrected = []  # words after command spelling correction
+        self.cursors = []  # (start position, trie node) of partial phrases
+        self.pending = None  # (start, end position, payload) of a complete phrase
+        self.stable = 0
+        self.decision = None
+
+    def feed(self, transcript):
+        """Take the transcript so far; returns a classification once decided"""
+        if self.decision is not None:
+            return self.decision
+
+        words = [word.strip('.,!?') for word in transcript.lower().split()]
+        if words[:len(self.words)] != self.words:
+            # The recognizer revised an earlier word; start over
+            self.reset()
+
+        new_words = words[len(self.words):]
+        if not new_words:
+            if self.pending is not None:
+                self.stable += 1
+                if self.stable >= self.stable_updates:
+                    self._decide()
+            return self.decision
+
+        self.stable = 0
+        for word in new_words:
+            self._advance(word)
+            if self.decision is not None:
+                break
+        return self.decision
+
+    def finalize(self, transcript=None):
+        """Classify the finished utterance and reset for the next one"""
+        decision = self.decision
+        if decision is None:
+            text = transcript if transcript is not None else ' '.join(self.words)
+            decision = self.nlp.classify_input(text)
+        self.reset()
+        return decision
+
+    def _advance(self, word):
+        corrected = self.nlp._correct_command_word(word, self.grammar) or word
+        position = len(self.words)
+        self.words.append(word)
+        self.corrected.append(corrected)
+
+        cursors = []
+        for start, node in self.cursors + [(position, self.grammar.trie.root)]:
+            child = node[0].get(corrected)
+            if child is not None:
+                cursors.append((start, child))
+        self.cursors = cursors
+
+        if self.pending is not None:
+            extended = any(start == self.pending[0] for start, _ in cursors)
+            if not extended:
+                if word in COMMAND_TERMINATORS and position == self.pending[1] + 1:
+                    self._decide()
+                    return
+                # More than a bare command; leave it to finalize
+                self.pending = None
+
+        # Prefer the phrase that started earliest, i.e. the longest one
+        for start, node in cursors:
+            payloads = node[1]
+            if (len({category for category, _ in payloads}) == 1
+                    and payloads[0][0] in EARLY_CATEGORIES
+                    and all(w in COMMAND_FILLERS for w in self.words[:start])):
+                self.pending = (start, position, payloads[0])
+                break
+
+    def _decide(self):
+        category, command = self.pending[2]
+        text = ' '.join(self.words)
+
+        # Do not act early on something the user has corrected before
+        learned = self.nlp.learning_store.learned_confidence(pattern_key(text))
+        if learned is not None and learned < self.nlp.confidence_threshold:
+            self.pending = None
+            return
+
+        self.decision = {
+            'type': 'system',
+            'category': category,
+            'command': command,
+            'confidence': 1.0,
+            'early': True,
+            'text': text
+        }
@@ -0,0 +1,93 @@
+from collections import deque
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    All patterns are compiled into one trie with failure links, so a single
+    left-to-right pass over the text reports every occurrence of every
+    pattern (as a substring, the same semantics as ``pattern in text``).
+    """
+
+    def __init__(self, patterns=()):
+        """patterns: iterable of (pattern, payload) pairs"""
+        self.goto = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for pattern, payload in patterns:
+            self.add(pattern, payload)
+        self.build()
+
+    def add(self, pattern, payload=None):
+        """Add a pattern; call build() before searching again"""
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            next_node = self.goto[node].get(char)
+            if next_node is None:
+                next_node = len(self.goto)
+                self.goto[node][char] = next_node
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = next_node
+        self.outputs[node].append((pattern, payload))
+
+    def build(self):
+        """Compute failure links breadth-first and merge inherited outputs"""
+        queue = deque()
+        for next_node in self.goto[0].values():
+            self.fail[next_node] = 0
+            queue.append(next_node)
+
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self.goto[node].items():
+                queue.append(next_node)
+                fallback = self.fail[node]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_node] = self.goto[fallback].get(char, 0)
+                self.outputs[next_node] = (
+                    self.outputs[next_node] + self.outputs[self.fail[next_node]]
+                )
+
+    def iter_matches(self, text):
+        """Yield (end index, pattern, payload) for every occurrence in text"""
+        goto = self.goto
+        fail = self.fail
+        outputs = self.outputs
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for pattern, payload in outputs[node]:
+                yield i, pattern, payload
+
+    def find_all(self, text):
+        """Return the payloads of every pattern occurring in text, once each"""
+        seen = {}
+        for _, pattern, payload in self.iter_matches(text):
+            seen.setdefault(pattern, payload)
+        return seen
+
+    def contains_any(self, text):
+        """True if any pattern occurs in text"""
+        for _ in self.iter_matches(text):
+            return True
+        return False
+
+
+class PhraseTrie:
+    """Word-level trie over the command phrases"""
+
+    def __init__(self, entries=()):
+        """entries: iterable of (category, command, lowercased command)"""
+        self.root = ({}, [])  # (children by word, [(category, command)])
+        for category, cmd, cmd_lower in entries:
+            node = self.root
+            for word in cmd_lower.split():
+                node = node[0].setdefault(word, ({}, []))
+            node[1].append((category, cmd))
@@ -0,0 +1,311 @@
+import glob
+import json
+import os
+import threading
+from datetime import datetime
+
+# Tables of learned values kept in memory and in the snapshot
+STATE_TABLES = ("command_patterns", "confidence_adjustments", "pattern_stats")
+
+# Lists from the old single-file format that now live in the history log
+LEGACY_HISTORY_LISTS = ("successful_commands", "user_corrections")
+
+
+class LearningStore:
+    """Journaled, crash-safe storage for what NLPProcessor learns.
+
+    Three files live next to ``path`` (``nlp_learning.json`` by default):
+
+    - ``nlp_learning.json``: snapshot of the learned tables, always
+      replaced atomically.
+    - ``nlp_learning.journal.jsonl``: table updates made since the last
+      snapshot, one JSON object per line.
+    - ``nlp_learning.history.jsonl``: append-only log of interactions and
+      corrections. It is never read at startup.
+
+    Recording an interaction appends a line or two, so its cost does not
+    depend on how much has been learned. Every ``compact_every`` journal
+    entries the tables are written to a new snapshot and the journal is
+    truncated.
+
+    Memory stays bounded: at most ``max_patterns`` patterns are remembered
+    (least recently seen are evicted), and the history log is rotated into
+    ``nlp_learning.history.<timestamp>.jsonl`` segments once it reaches
+    ``max_history_bytes`` or ``max_history_age_days``, keeping the newest
+    ``max_archives`` segments. ``recent_limit`` caps the in-memory lists of
+    recent interactions kept by NLPProcessor.
+    """
+
+    def __init__(self, path="nlp_learning.json", compact_every=500, fsync=False,
+                 max_patterns=5000, recent_limit=100,
+                 max_history_bytes=5 * 1024 * 1024, max_history_age_days=30,
+                 max_archives=5):
+        stem, _ = os.path.splitext(path)
+        self.path = path
+        self.journal_path = f"{stem}.journal.jsonl"
+        self.history_path = f"{stem}.history.jsonl"
+        self.archive_pattern = f"{stem}.history.*.jsonl"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.max_patterns = max_patterns
+        self.recent_limit = recent_limit
+        self.max_history_bytes = max_history_bytes
+        self.max_history_age_days = max_history_age_days
+        self.max_archives = max_archives
+        self.state = {table: {} for table in STATE_TABLES}
+        self._journal_entries = 0
+        self._history_bytes = 0
+        self._history_started = None
+        self._lock = threading.Lock()
+
+    def reset_after_fork(self):
+        """Replace the lock, which another thread may have held at fork time"""
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the snapshot and replay the journal on top of it"""
+        with self._lock:
+            self.state = {table: {} for table in STATE_TABLES}
+            snapshot = self._read_snapshot()
+            for table in STATE_TABLES:
+                self.state[table].update(snapshot.get(table, {}))
+
+            self._journal_entries = 0
+            for entry in self._read_jsonl(self.journal_path):
+                table = self.state.get(entry.get("table"))
+                if table is None:
+                    continue
+                # Re-insert so dict order keeps tracking recency
+                table.pop(entry["key"], None)
+                if entry.get("op") == "set":
+                    table[entry["key"]] = entry["value"]
+                self._journal_entries += 1
+
+            # Adjustments learned before stats existed count as oldest
+            stats = self.state["pattern_stats"]
+            missing = {
+                pattern: {"success": 0, "failure": 0, "corrections": 0, "last_seen": None}
+                for pattern in self.state["confidence_adjustments"]
+                if pattern not in stats
+            }
+            if missing:
+                self.state["pattern_stats"] = stats = {**missing, **stats}
+
+            # Move history out of an old-format snapshot, once
+            legacy = any(snapshot.get(name) for name in LEGACY_HISTORY_LISTS)
+            if legacy:
+                self._migrate_legacy_history(snapshot)
+
+            evicted = self._evict_patterns(journal=False)
+            if legacy or missing or evicted:
+                self._write_snapshot()
+
+            self._open_history_segment()
+        return self.state
+
+    def rekey(self, key_fn):
+        """Move every pattern to key_fn(pattern), merging patterns that collide.
+
+        Counters of merged patterns are added up; for the other tables the
+        most recently seen value wins. Patterns mapped to None are dropped. Writes a snapshot if any key changed
+        and returns the state.
+        """
+        with self._lock:
+            stats = self.state["pattern_stats"]
+            if all(key_fn(pattern) == pattern for table in STATE_TABLES
+                   for pattern in self.state[table]):
+                return self.state
+
+            # Visit patterns oldest first so later values overwrite earlier ones
+            rekeyed = {table: {} for table in STATE_TABLES}
+            for table in STATE_TABLES:
+                old = self.state[table]
+                order = [p for p in stats if p in old] + [p for p in old if p not in stats]
+                merged = rekeyed[table]
+                for pattern in order:
+                    key = key_fn(pattern)
+                    if key is None:
+                        continue
+                    previous = merged.pop(key, None)
+                    value = old[pattern]
+                    if table == "pattern_stats" and previous is not None:
+                        value = self._merge_stats(previous, value)
+                    merged[key] = value
+
+            self.state = rekeyed
+            self._evict_patterns(journal=False)
+            self._write_snapshot()
+            return self.state
+
+    @staticmethod
+    def _merge_stats(older, newer):
+        return {
+            "success": older.get("success", 0) + newer.get("success", 0),
+            "failure": older.get("failure", 0) + newer.get("failure", 0),
+            "corrections": older.get("corrections", 0) + newer.get("corrections", 0),
+            "last_seen": newer.get("last_seen") or older.get("last_seen")
+        }
+
+    def learned_confidence(self, pattern):
+        """Aggregated confidence adjustment for a pattern, or None"""
+        return self.state["confidence_adjustments"].get(pattern)
+
+    def update_pattern(self, pattern, confidence=None, success=None,
+                       correction=False, timestamp=None):
+        """Fold one feedback event into the per-pattern counters.
+        
+        Returns the patterns evicted to stay within max_patterns.
+        """
+        with self._lock:
+            stats = self.state["pattern_stats"].pop(pattern, None) or {
+                "success": 0, "failure": 0, "corrections": 0, "last_seen": None
+            }
+            if success is True:
+                stats["success"] += 1
+            elif success is False:
+                stats["failure"] += 1
+            if correction:
+                stats["corrections"] += 1
+            stats["last_seen"] = timestamp or datetime.now().isoformat()
+            self._set("pattern_stats", pattern, stats)
+
+            if confidence is not None:
+                self.state["confidence_adjustments"].pop(pattern, None)
+                self._set("confidence_adjustments", pattern, confidence)
+
+            evicted = self._evict_patterns()
+            self._maybe_compact()
+            return evicted
+
+    def set(self, table, key, value):
+        """Update one learned value and journal the change"""
+        with self._lock:
+            self._set(table, key, value)
+            self._maybe_compact()
+
+    def append_history(self, kind, record):
+        """Append an interaction or correction to the history log"""
+        with self._lock:
+            if self._history_due_for_rotation():
+                self._rotate_history()
+            self._history_bytes += self._append(
+                self.history_path, {"kind": kind, **record}
+            )
+
+    def compact(self):
+        """Write a fresh snapshot and truncate the journal"""
+        with self._lock:
+            self._write_snapshot()
+
+    def _set(self, table, key, value):
+        self.state[table][key] = value
+        self._append(self.journal_path, {
+            "op": "set", "table": table, "key": key, "value": value
+        })
+        self._journal_entries += 1
+
+    def _delete(self, table, key):
+        if self.state[table].pop(key, None) is not None:
+            self._append(self.journal_path, {"op": "delete", "table": table, "key": key})
+            self._journal_entries += 1
+
+    def _maybe_compact(self):
+        if self._journal_entries >= self.compact_every:
+            self._write_snapshot()
+
+    def _evict_patterns(self, journal=True):
+        """Forget the least recently seen patterns beyond max_patterns"""
+        stats = self.state["pattern_stats"]
+        evicted = []
+        while len(stats) > self.max_patterns:
+            pattern = next(iter(stats))
+            for table in ("pattern_stats", "confidence_adjustments"):
+                if journal:
+                    self._delete(table, pattern)
+                else:
+                    self.state[table].pop(pattern, None)
+            evicted.append(pattern)
+        return evicted
+
+    def _open_history_segment(self):
+        """Pick up size and start time of the current history segment"""
+        self._history_bytes = 0
+        self._history_started = datetime.now()
+        if not os.path.exists(self.history_path):
+            return
+        self._history_bytes = os.path.getsize(self.history_path)
+        with open(self.history_path, "r") as f:
+            try:
+                first = json.loads(f.readline())
+                self._history_started = datetime.fromisoformat(first["timestamp"])
+            except (ValueError, KeyError, TypeError):
+                pass
+
+    def _history_due_for_rotation(self):
+        if self._history_bytes == 0:
+            return False
+        if self._history_bytes >= self.max_history_bytes:
+            return True
+        if self._history_started is None:
+            return False
+        age = datetime.now() - self._history_started
+        return age.days >= self.max_history_age_days
+
+    def _rotate_history(self):
+        """Archive the current history segment and prune old archives"""
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        stem, _ = os.path.splitext(self.path)
+        os.replace(self.history_path, f"{stem}.history.{stamp}.jsonl")
+        archives = sorted(glob.glob(self.archive_pattern))
+        for old in archives[:-self.max_archives] if self.max_archives else archives:
+            os.remove(old)
+        self._history_bytes = 0
+        self._history_started = datetime.now()
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _read_jsonl(self, path):
+        if not os.path.exists(path):
+            return
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    continue
+
+    def _append(self, path, entry):
+        line = json.dumps(entry) + "\n"
+        with open(path, "a") as f:
+            f.write(line)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        return len(line)
+
+    def _write_snapshot(self):
+        # Write beside the target and rename, so readers never see a
+        # partial file. Replaying a stale journal is harmless because
+        # every entry is an absolute "set".
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        open(self.journal_path, "w").close()
+        self._journal_entries = 0
+
+    def _migrate_legacy_history(self, snapshot):
+        for record in snapshot.get("successful_commands", []):
+            self._append(self.history_path, {"kind": "interaction", **record})
+        for record in snapshot.get("user_corrections", []):
+            self._append(self.history_path, {"kind": "correction", **record})
@@ -0,0 +1,174 @@
+import bisect
+import threading
+import time
+
+# Upper bounds in seconds, from sub-millisecond matching to LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Histogram:
+    """Cumulative-style latency histogram for one metric and label set"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """(cumulative bucket counts, sum, count) taken atomically"""
+        with self._lock:
+            cumulative = []
+            total = 0
+            for count in self.counts:
+                total += count
+                cumulative.append(total)
+            return cumulative, self.sum, self.count
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class _NullTimer:
+    """Shared do-nothing timer handed out while metrics are disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Latency histograms keyed by metric name and labels.
+
+    ``timer`` returns a context manager that records how long its block
+    took. While the registry is disabled it returns a shared no-op timer,
+    so instrumented code pays one attribute check and an empty ``with``.
+    Metrics can be switched on and off at runtime and rendered in the
+    Prometheus text format or as a dict.
+    """
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._histograms = {}  # (name, sorted label items) -> Histogram
+        self._lock = threading.Lock()
+
+    def timer(self, name, **labels):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def observe(self, name, seconds, **labels):
+        """Record one duration"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    def set_enabled(self, enabled):
+        self.enabled = bool(enabled)
+
+    def reset(self):
+        """Drop every recorded observation"""
+        with self._lock:
+            self._histograms = {}
+
+    def to_dict(self):
+        """Recorded histograms as plain data, grouped by metric name"""
+        result = {}
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            cumulative, total, count = histogram.snapshot()
+            result.setdefault(name, []).append({
+                'labels': dict(labels),
+                'count': count,
+                'sum': total,
+                'mean': total / count if count else 0.0,
+                'buckets': dict(zip(
+                    [str(bound) for bound in histogram.buckets] + ['+Inf'], cumulative
+                ))
+            })
+        return {'enabled': self.enabled, 'metrics': result}
+
+    def render_prometheus(self):
+        """Recorded histograms in the Prometheus text exposition format"""
+        lines = []
+        seen = set()
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            if name not in seen:
+                lines.append(f"# TYPE {name} histogram")
+                seen.add(name)
+            cumulative, total, count = histogram.snapshot()
+            label_text = ','.join(f'{key}="{value}"' for key, value in labels)
+            prefix = f"{label_text}," if label_text else ''
+            bounds = [repr(float(bound)) for bound in histogram.buckets] + ['+Inf']
+            for bound, value in zip(bounds, cumulative):
+                lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {value}')
+            suffix = f"{{{label_text}}}" if label_text else ''
+            lines.append(f"{name}_sum{suffix} {total}")
+            lines.append(f"{name}_count{suffix} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+class ObservationLog(MetricsRegistry):
+    """Registry that keeps raw observations for replaying into another one.
+
+    Worker processes record into one and hand ``drain()`` back to the
+    parent with each result, so their timings show up in its registry.
+    """
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        super().__init__(enabled, buckets)
+        self.observations = []
+
+    def observe(self, name, seconds, **labels):
+        if self.enabled:
+            self.observations.append((name, seconds, labels))
+
+    def drain(self):
+        """Observations since the last drain, as (name, seconds, labels)"""
+        observations, self.observations = self.observations, []
+        return observations
+
+
+# Process-wide registry used by the instrumented modules
+registry = MetricsRegistry()
+
+
+def timer(name, **labels):
+    """Time a block against the process-wide registry"""
+    if not registry.enabled:
+        return _NULL_TIMER
+    return _Timer(registry, name, labels)
@@ -1,108 +1,502 @@
-import spacy
-import nltk
-nltk.download('punkt_tab')
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
 import re
-from functools import lru_cache
+import difflib
+import hashlib
+import heapq
+import threading
+import time
 from Processing.ollama_generator import OllamaGenerator
+from Processing.command_matcher import CommandMatcher
+from Processing.vector_matcher import VectorCommandMatcher
+from Processing.text_analysis import TextAnalysis
+from Processing.learning_store import LearningStore
+from Processing.analysis_cache import AnalysisCache
+from Processing.command_grammar import CommandGrammar, GRAMMAR_FILE, phrase_key
+from Processing import metrics
+from commands.app_commands import AppCommands
 import json
-from spellchecker import SpellChecker
-import os
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+from operator import itemgetter
+
+SPACY_MODEL = 'en_core_web_sm'
+
+# Histogram of time spent in each stage of classify_input
+CLASSIFY_METRIC = 'ash_classify_stage_seconds'
+
+# Histogram of classification time by the tier that decided the result
+TIER_METRIC = 'ash_classify_tier_seconds'
+
+# Classification tiers, cheapest first:
+#   0: app verb or exact grammar phrase, no matching and no model
+#   1: command matcher, context from keywords only, no model
+#   2: full spaCy analysis for generation and unclear inputs
+CLASSIFY_TIERS = (0, 1, 2)
+
+# Command phrase matchers selectable with NLPProcessor(matcher=...)
+MATCHERS = {
+    'index': CommandMatcher,
+    'vector': VectorCommandMatcher
+}
+
+# NLTK resources used by preprocess_text, keyed by download name
+NLTK_RESOURCES = {
+    'punkt_tab': 'tokenizers/punkt_tab',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet'
+}
+
+# spaCy pipes whose output the classifier never reads. Entities, POS and
+# fine-grained tags come from ner, tagger and attribute_ruler. The spaCy
+# preprocessor lemmatizes the few tokens it keeps on demand (and caches
+# them), so the lemmatizer pipe can stay disabled. Without the parser there
+# are no dependencies: get_dependencies raises and batch_process omits them.
+UNUSED_SPACY_PIPES = ('parser', 'lemmatizer')
+
+# Token/lemma sources for preprocess_text. 'spacy' reuses the Doc the
+# classifier parses anyway and never loads NLTK or WordNet.
+PREPROCESSORS = ('nltk', 'spacy')
+
+# Words that suggest a generation request, by strength
+GENERATION_INDICATORS = {
+    'high': (
+        'tell', 'explain', 'write', 'generate', 'create', 'make', 'show',
+        'describe', 'elaborate', 'define', 'what', 'how', 'why', 'when',
+        'who', 'where', 'which'
+    ),
+    'medium': (
+        'is', 'are', 'was', 'were', 'will', 'can', 'could', 'would',
+        'should', 'may', 'might', 'do', 'does', 'did', 'mean', 'work',
+        'function', 'help', 'guide', 'teach'
+    ),
+    'low': (
+        'the', 'a', 'an', 'any', 'some', 'many', 'few', 'about',
+        'like', 'similar', 'different', 'other'
+    )
+}
+
+# Flat word -> score table; stronger tiers are applied last so they win
+GENERATION_WEIGHTS = {
+    word: weight
+    for tier, weight in (('low', 0.1), ('medium', 0.2), ('high', 0.3))
+    for word in GENERATION_INDICATORS[tier]
+}
+QUESTION_START_WORDS = frozenset(GENERATION_INDICATORS['high'])
+
+# Category-specific context keywords
+CONTEXT_KEYWORDS = {
+    'volume': ('sound', 'audio', 'speaker', 'loud', 'quiet'),
+    'brightness': ('screen', 'display', 'dim', 'light', 'dark'),
+    'power': ('system', 'computer', 'device', 'machine'),
+    # Add more categories...
+}
+
+
+def invert_table(table):
+    """Turn {category: values} into {value: [categories]}"""
+    inverted = defaultdict(list)
+    for category, values in table.items():
+        for value in values:
+            inverted[value].append(category)
+    return dict(inverted)
+
+
+# Keyword -> categories, so one pass over the words of an utterance scores
+# every category at once
+CONTEXT_KEYWORD_INDEX = invert_table(CONTEXT_KEYWORDS)
+
+# POS sequences typical of each category, e.g. "increase volume"
+POS_PATTERNS = {
+    'volume': ('VERB', 'NOUN'),
+    'brightness': ('VERB', 'NOUN'),
+    'power': ('VERB',),
+    'app': ('VERB', 'PROPN'),
+}
+POS_PATTERN_LENGTHS = frozenset(len(pattern) for pattern in POS_PATTERNS.values())
+
+# Entity labels that support each category
+ENTITY_LABELS = {
+    'app': frozenset({'PRODUCT', 'ORG', 'GPE'}),  # Software names, organizations
+    'file': frozenset({'FILE', 'PATH'}),  # File names and paths
+    'network': frozenset({'ORG', 'GPE'}),  # Network names, locations
+    'security': frozenset({'ORG', 'PERSON'}),  # Security-related entities
+}
+
+# Words that spelling correction must never change
+PRESERVE_WORDS = frozenset({
+    # Programming terms
+    'python', 'java', 'javascript', 'cpp', 'html', 'css', 'sql',
+    'api', 'json', 'xml', 'npm', 'git', 'docker', 'kubernetes',
+    # Common abbreviations
+    'ai', 'ml', 'nlp', 'api', 'gui', 'cli', 'sdk', 'ide',
+    # Technical terms
+    'regex', 'async', 'sync', 'crud', 'dom', 'url', 'uri',
+    # File extensions
+    'txt', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'csv',
+    # Common names and brands
+    'google', 'microsoft', 'apple', 'linux', 'windows', 'mac',
+    'chrome', 'firefox', 'safari', 'edge', 'vscode'
+})
+
+
+def normalize_input(text):
+    """Collapse whitespace so trivially different inputs share one result"""
+    return ' '.join(text.split())
+
+
+# Learned patterns are stored as this prefix plus a 16-digit hash
+PATTERN_KEY_PREFIX = 'p:'
+
+# Hashed keys of an earlier canonical form that also dropped words like
+# "i want to", so "i want to sleep" learned from "sleep". They cannot be
+# mapped to the new form and are dropped when the learning data loads.
+STALE_KEY_PREFIXES = ('k:',)
+
+
+def canonical_pattern(text):
+    """Lowercased words of an input without punctuation, fillers or plurals.
+
+    Only the politeness and addressing words of COMMAND_FILLERS are
+    dropped ("hey ash, mute please" is "mute"); anything that can make a
+    statement out of a command ("i want to sleep") is kept.
+    """
+    words = phrase_key(text).split()
+    if not words:
+        # An input made only of fillers ("ok thanks") keys on its own words
+        return ' '.join(re.findall(r"[a-z0-9']+", text.lower()))
+    return ' '.join(_strip_plural(word) for word in words)
+
+
+def _strip_plural(word):
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def pattern_key(text):
+    """Key under which learned confidence is stored for an input.
+
+    Inputs with the same canonical_pattern share a key. The key is a short
+    fixed-size hash, so the learning tables cost the same per entry however
+    long the utterances are.
+    """
+    digest = hashlib.blake2b(canonical_pattern(text).encode('utf-8'), digest_size=8)
+    return PATTERN_KEY_PREFIX + digest.hexdigest()
+
+
+def migrate_pattern_key(key):
+    """Map a key stored by an older version to pattern_key, or None to drop it.
+
+    The oldest versions keyed on the lowercased input, which is rekeyed.
+    """
+    if key.startswith(PATTERN_KEY_PREFIX):
+        return key
+    if key.startswith(STALE_KEY_PREFIXES):
+        return None
+    return pattern_key(key)
+
+
+def ensure_nltk_resource(name, offline=False):
+    """Make sure an NLTK resource is installed, downloading only if allowed"""
+    import nltk
+    
+    try:
+        nltk.data.find(NLTK_RESOURCES[name])
+    except LookupError:
+        if offline:
+            raise LookupError(
+                f"NLTK resource '{name}' is not installed and offline mode is on. "
+                f"Run nltk.download('{name}') on a connected machine and copy "
+                f"nltk_data to this host."
+            )
+        nltk.download(name, quiet=True)
+
 
 class NLPProcessor:
-    def __init__(self, language='en', model_name="llama2"):
-        # Download required NLTK resources
-        nltk.download('punkt')
-        nltk.download('stopwords')
-        nltk.download('wordnet')
-        
-        # Initialize spaCy model
-        self.nlp = spacy.load('en_core_web_sm')
-        self.lemmatizer = WordNetLemmatizer()
-        self.stop_words = set(stopwords.words('english'))
+    def __init__(self, language='en', model_name="llama2", offline=False,
+                 lazy=False, trim_pipeline=False, learning_store=None, cache=None,
+                 classification_cache=None, matcher='index', preprocessor='nltk',
+                 grammar_file=None):
+        """
+        offline: only check for local NLTK data, never download it
+        lazy: load spaCy, NLTK and the spell checker on first use
+        trim_pipeline: disable the spaCy pipes the classifier never reads
+        learning_store: LearningStore to use, e.g. with custom retention limits
+        cache: AnalysisCache for analysis results; pass shared_cache() to share
+            one across processors, or a cache with a TTL or byte budget
+        classification_cache: AnalysisCache for whole classification results
+        matcher: 'index' scores phrases with difflib behind a character index;
+            'vector' uses char n-gram TF-IDF products (needs numpy) for large
+            command tables
+        preprocessor: 'nltk' tokenizes and lemmatizes with NLTK and WordNet;
+            'spacy' takes tokens and lemmas from the spaCy Doc instead
+        grammar_file: JSON command grammar (phrases and aliases per category);
+            defaults to Processing/command_grammar.json
+        """
+        if matcher not in MATCHERS:
+            raise ValueError(f"Unknown matcher {matcher!r}, expected one of {sorted(MATCHERS)}")
+        if preprocessor not in PREPROCESSORS:
+            raise ValueError(f"Unknown preprocessor {preprocessor!r}, expected one of {PREPROCESSORS}")
+        self.matcher_class = MATCHERS[matcher]
+        self.preprocessor = preprocessor
+        self.offline = offline
+        self.disabled_pipes = UNUSED_SPACY_PIPES if trim_pipeline else ()
+        self._components = {}
+        self._load_lock = threading.Lock()
+        self.cache = cache if cache is not None else AnalysisCache(maxsize=1000)
+        self.classification_cache = (
+            classification_cache if classification_cache is not None
+            else AnalysisCache(maxsize=512)
+        )
+        self.lemma_cache = AnalysisCache(maxsize=4096)  # (word, POS) -> lemma
+        self.tier_counts = dict.fromkeys(CLASSIFY_TIERS, 0)
+        self._tier_lock = threading.Lock()
         
         # Initialize Ollama generator
         self.generator = OllamaGenerator(model_name)
         
-        # Define system command patterns
-        self.system_commands = {
-            'volume': [
-                'increase volume', 'decrease volume', 'mute', 'unmute',
-                'volume up', 'volume down', 'set volume', 'max volume',
-                'min volume', 'adjust volume'
-            ],
-            'brightness': [
-                'increase brightness', 'decrease brightness', 'max brightness',
-                'min brightness', 'adjust brightness', 'set brightness',
-                'screen brighter', 'screen dimmer'
-            ],
-            'power': [
-                'shutdown', 'restart', 'sleep', 'wake up', 'hibernate',
-                'power off', 'turn off', 'reboot', 'log out', 'sign out',
-                'lock screen', 'unlock screen'
-            ],
-            'app': [
-                'open', 'close', 'start', 'stop', 'launch', 'quit',
-                'minimize', 'maximize', 'restore', 'force quit',
-                'switch to', 'focus on', 'run app', 'kill app'
-            ],
-            'system': [
-                'update', 'install', 'uninstall', 'check status',
-                'clean temp', 'clear cache', 'check memory', 'check cpu',
-                'check storage', 'system info', 'task manager'
-            ],
-            'network': [
-                'wifi on', 'wifi off', 'connect wifi', 'disconnect wifi',
-                'bluetooth on', 'bluetooth off', 'airplane mode',
-                'check internet', 'network status', 'show wifi networks'
-            ],
-            'media': [
-                'play', 'pause', 'stop', 'next', 'previous', 'fast forward',
-                'rewind', 'shuffle', 'repeat', 'mute audio', 'unmute audio'
-            ],
-            'file': [
-                'copy', 'paste', 'cut', 'delete', 'rename', 'move',
-                'new folder', 'new file', 'compress', 'extract',
-                'download', 'upload', 'share', 'search files'
-            ],
-            'display': [
-                'change resolution', 'rotate screen', 'mirror display',
-                'extend display', 'night mode', 'dark mode', 'light mode',
-                'change wallpaper', 'screen saver'
-            ],
-            'input': [
-                'enable keyboard', 'disable keyboard', 'enable touchpad',
-                'disable touchpad', 'enable mouse', 'disable mouse',
-                'keyboard layout', 'input language'
-            ],
-            'security': [
-                'enable firewall', 'disable firewall', 'scan virus',
-                'update antivirus', 'check permissions', 'encrypt',
-                'decrypt', 'backup data', 'restore backup'
-            ],
-            'accessibility': [
-                'enable narrator', 'disable narrator', 'high contrast',
-                'magnifier on', 'magnifier off', 'voice control',
-                'closed captions', 'screen reader'
-            ]
-        }
         
-        # Initialize spell checker
-        self.spell = SpellChecker()
+        # Load the command grammar and compile it for fast matching
+        self.grammar_file = grammar_file or GRAMMAR_FILE
+        self.spelling_index_file = "nlp_spelling_index.json"
+        self._reload_lock = threading.Lock()
+        self.grammar = self._compile_grammar(CommandGrammar.load(self.grammar_file))
         
         # Add learning-related initialization
         self.learning_file = "nlp_learning.json"
+        self.learning_store = learning_store or LearningStore(self.learning_file)
         self.interaction_history = self._load_learning_data()
         self.command_patterns = defaultdict(float)
         self.confidence_threshold = 0.6  # Adjustable threshold
         
-    @lru_cache(maxsize=1000)
+        # Load heavy components up front unless asked to defer them
+        if not lazy:
+            self.load_components()
+    
+    def reset_after_fork(self):
+        """Start a forked child with fresh locks and empty caches.
+        
+        Another thread of the parent may have held any of them at fork time.
+        """
+        self._load_lock = threading.Lock()
+        self._tier_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self.cache = self.cache.empty_copy()
+        self.classification_cache = self.classification_cache.empty_copy()
+        self.lemma_cache = self.lemma_cache.empty_copy()
+        self.learning_store.reset_after_fork()
+    
+    def update_system_commands(self, system_commands, aliases=None):
+        """Replace the command table and drop results computed with the old one"""
+        return self._swap_grammar(CommandGrammar(system_commands, aliases))
+    
+    def reload_grammar(self, path=None):
+        """Load the grammar file again and swap it in; returns the new grammar.
+        
+        Only the command structures are rebuilt (milliseconds), not the
+        models. Raises OSError or ValueError and keeps the current grammar
+        if the file cannot be loaded.
+        """
+        path = path or self.grammar_file
+        return self._swap_grammar(CommandGrammar.load(path))
+    
+    def _swap_grammar(self, grammar):
+        with self._reload_lock:
+            grammar = self._compile_grammar(grammar)
+            # A single reference assignment: classifications already running
+            # keep the grammar they read when they started
+            self.grammar = grammar
+            self.classification_cache.clear()
+        return grammar
+    
+    def _compile_grammar(self, grammar):
+        return grammar.compile(
+            self.matcher_class,
+            self.spelling_index_file,
+            self._spelling_vocabulary(grammar)
+        )
+    
+    # Views of the current grammar
+    
+    @property
+    def system_commands(self):
+        return self.grammar.system_commands
+    
+    @property
+    def command_matcher(self):
+        return self.grammar.matcher
+    
+    @property
+    def command_automaton(self):
+        return self.grammar.automaton
+    
+    @property
+    def command_trie(self):
+        return self.grammar.trie
+    
+    @property
+    def command_token_index(self):
+        return self.grammar.token_index
+    
+    @property
+    def spelling_index(self):
+        return self.grammar.spelling_index
+    
+    def _spelling_vocabulary(self, grammar):
+        """Words spelling correction may produce, most important first"""
+        words = grammar.words()
+        for apps in AppCommands.APP_PATHS.values():
+            for app_name in apps:
+                words.extend(app_name.split())
+        words.extend(sorted(PRESERVE_WORDS))
+        for keywords in CONTEXT_KEYWORDS.values():
+            words.extend(keywords)
+        for indicators in GENERATION_INDICATORS.values():
+            words.extend(indicators)
+        return words
+    
+    def load_components(self):
+        """Load every heavy component now instead of on first use"""
+        components = {'nlp': self.nlp}
+        if self.preprocessor == 'nltk':
+            components['tokenizer'] = self.tokenizer
+            components['stop_words'] = self.stop_words
+            components['lemmatizer'] = self.lemmatizer
+        else:
+            components['spacy_lemmatizer'] = self.spacy_lemmatizer
+        components['spell'] = self.spell
+        return components
+    
+    def _load(self, name, loader):
+        """Return a cached component, building it once under a lock"""
+        component = self._components.get(name)
+        if component is None:
+            with self._load_lock:
+                component = self._components.get(name)
+                if component is None:
+                    component = loader()
+                    self._components[name] = component
+        return component
+    
+    def _load_spacy(self):
+        import spacy
+        return spacy.load(SPACY_MODEL, disable=list(self.disabled_pipes))
+    
+    def _load_tokenizer(self):
+        ensure_nltk_resource('punkt_tab', self.offline)
+        from nltk.tokenize import word_tokenize
+        return word_tokenize
+    
+    def _load_stop_words(self):
+        ensure_nltk_resource('stopwords', self.offline)
+        from nltk.corpus import stopwords
+        return set(stopwords.words('english'))
+    
+    def _load_lemmatizer(self):
+        ensure_nltk_resource('wordnet', self.offline)
+        from nltk.stem import WordNetLemmatizer
+        return WordNetLemmatizer()
+    
+    def _load_spacy_lemmatizer(self):
+        # A disabled pipe is still loaded and can lemmatize single tokens
+        if 'lemmatizer' in self.nlp.pipe_names:
+            return False  # Docs already carry lemmas
+        if 'lemmatizer' in self.nlp.component_names:
+            return self.nlp.get_pipe('lemmatizer')
+        return False
+    
+    def _load_spell_checker(self):
+        from spellchecker import SpellChecker
+        return SpellChecker()
+    
+    @property
+    def nlp(self):
+        """spaCy pipeline"""
+        return self._load('nlp', self._load_spacy)
+    
+    @property
+    def tokenizer(self):
+        """NLTK word tokenizer"""
+        return self._load('tokenizer', self._load_tokenizer)
+    
+    @property
+    def stop_words(self):
+        """NLTK English stopword set"""
+        return self._load('stop_words', self._load_stop_words)
+    
+    @property
+    def lemmatizer(self):
+        """NLTK WordNet lemmatizer"""
+        return self._load('lemmatizer', self._load_lemmatizer)
+    
+    @property
+    def spacy_lemmatizer(self):
+        """spaCy lemmatizer pipe for on-demand lemmas, or False if not needed"""
+        return self._load('spacy_lemmatizer', self._load_spacy_lemmatizer)
+    
+    @property
+    def spell(self):
+        """pyspellchecker instance used by _correct_spelling"""
+        return self._load('spell', self._load_spell_checker)
+        
+    def cache_stats(self):
+        """Hit, miss and eviction counters of the analysis and result caches"""
+        return {
+            'analysis': self.cache.stats(),
+            'classification': self.classification_cache.stats(),
+            'lemma': self.lemma_cache.stats()
+        }
+    
+    def tier_stats(self):
+        """How many classifications each tier decided (cache hits not included)"""
+        with self._tier_lock:
+            counts = dict(self.tier_counts)
+        total = sum(counts.values())
+        return {
+            f'tier{tier}': {
+                'count': count,
+                'share': round(count / total, 4) if total else 0.0
+            }
+            for tier, count in counts.items()
+        }
+    
     def preprocess_text(self, text):
         """Clean and preprocess the input text with caching"""
+        if self.preprocessor == 'spacy':
+            return self.cache.get_or_compute(
+                ('preprocess', self.preprocessor, text),
+                lambda: self._preprocess_doc(self.nlp(text))
+            )
+        return self.cache.get_or_compute(
+            ('preprocess', self.preprocessor, text), lambda: self._preprocess(text)
+        )
+    
+    def _doc_tokens(self, text, doc):
+        """preprocess_text for a text whose Doc is already parsed"""
+        if self.preprocessor == 'spacy':
+            return self.cache.get_or_compute(
+                ('preprocess', self.preprocessor, text), lambda: self._preprocess_doc(doc)
+            )
+        return self.preprocess_text(text)
+    
+    def _preprocess_doc(self, doc):
+        """Lowercased lemmas of the alphabetic, non-stopword tokens of doc"""
+        lemmatize = self._lemmatize
+        return [lemmatize(token) for token in doc
+                if token.is_alpha and not token.is_stop]
+    
+    def _lemmatize(self, token):
+        lemmatizer = self.spacy_lemmatizer
+        if lemmatizer is False:
+            return (token.lemma_ or token.text).lower()
+        
+        def compute():
+            lemmas = lemmatizer.lemmatize(token)
+            return lemmas[0].lower() if lemmas else token.lower_
+        return self.lemma_cache.get_or_compute((token.lower_, token.pos_), compute)
+    
+    def _preprocess(self, text):
         # Convert to lowercase
         text = text.lower()
         
@@ -110,66 +504,83 @@ class NLPProcessor:
         text = re.sub(r'[^a-zA-Z\s]', '', text)
         
         # Tokenization
-        tokens = word_tokenize(text)
+        tokens = self.tokenizer(text)
         
         # Remove stopwords and lemmatize
-        tokens = [self.lemmatizer.lemmatize(token) 
+        lemmatizer = self.lemmatizer
+        stop_words = self.stop_words
+        tokens = [lemmatizer.lemmatize(token) 
                  for token in tokens 
-                 if token not in self.stop_words]
+                 if token not in stop_words]
         
         return tokens
     
-    @lru_cache(maxsize=1000)
     def extract_entities(self, text):
         """Extract named entities using spaCy with caching"""
-        doc = self.nlp(text)
-        entities = [(ent.text, ent.label_) for ent in doc.ents]
-        return entities
+        def compute():
+            doc = self.nlp(text)
+            return [(ent.text, ent.label_) for ent in doc.ents]
+        return self.cache.get_or_compute(('entities', text), compute)
     
     def get_pos_tags(self, text):
-        """Get Part of Speech tags"""
-        doc = self.nlp(text)
-        pos_tags = [(token.text, token.pos_) for token in doc]
-        return pos_tags
+        """Get Part of Speech tags with caching"""
+        def compute():
+            doc = self.nlp(text)
+            return [(token.text, token.pos_) for token in doc]
+        return self.cache.get_or_compute(('pos_tags', text), compute)
     
     def get_dependencies(self, text):
-        """Get dependency parsing"""
-        doc = self.nlp(text)
-        dependencies = [(token.text, token.dep_, token.head.text) 
-                       for token in doc]
-        return dependencies
-    
-    def batch_process(self, texts, batch_size=32):
-        """Process multiple texts efficiently"""
+        """Get dependency parsing with caching.
+        
+        Raises ValueError when the parser is disabled (trim_pipeline=True).
+        """
+        def compute():
+            return TextAnalysis(text, self.nlp(text)).dependencies
+        return self.cache.get_or_compute(('dependencies', text), compute)
+    
+    def analyze(self, text, lazy=False):
+        """Parse the text once and collect everything the classifier reads.
+        
+        With lazy=True spaCy runs only when a parsed view is first read.
+        """
+        if lazy:
+            return TextAnalysis(text, parse=self._parse)
+        return TextAnalysis(text, *self._parse(text))
+    
+    def _parse(self, text):
+        with metrics.timer(CLASSIFY_METRIC, stage='spacy_parse'):
+            doc = self.nlp(text)
+        with metrics.timer(CLASSIFY_METRIC, stage='preprocess'):
+            tokens = self._doc_tokens(text, doc)
+        return doc, tokens
+    
+    def analyze_batch(self, texts, batch_size=32, n_process=1):
+        """Parse many texts with nlp.pipe, yielding one analysis per text"""
+        texts = list(texts)
+        docs = self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+        for text, doc in zip(texts, docs):
+            yield TextAnalysis(text, doc, self._doc_tokens(text, doc))
+    
+    def batch_process(self, texts, batch_size=32, n_process=1):
+        """Process multiple texts efficiently.
+        
+        'dependencies' is left out when the parser is disabled.
+        """
         results = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            docs = list(self.nlp.pipe(batch))
-            batch_results = [
-                {
-                    'entities': [(ent.text, ent.label_) for ent in doc.ents],
-                    'pos_tags': [(token.text, token.pos_) for token in doc],
-                    'dependencies': [(token.text, token.dep_, token.head.text) 
-                                   for token in doc]
-                }
-                for doc in docs
-            ]
-            results.extend(batch_results)
+        for analysis in self.analyze_batch(texts, batch_size, n_process):
+            result = {
+                'entities': analysis.entities,
+                'pos_tags': analysis.pos_tags
+            }
+            if analysis.has_dependencies:
+                result['dependencies'] = analysis.dependencies
+            results.append(result)
         return results
     
     def analyze_and_generate(self, input_text):
         """Analyze text and generate appropriate response"""
-        # Preprocess and analyze the input
-        tokens = self.preprocess_text(input_text)
-        entities = self.extract_entities(input_text)
-        pos_tags = self.get_pos_tags(input_text)
-        
-        # Create context from analysis
-        context = {
-            "entities": entities,
-            "pos_tags": pos_tags,
-            "preprocessed_tokens": tokens
-        }
+        # Preprocess and analyze the input in a single pass
+        context = self.analyze(input_text).to_dict()
         
         return {
             "analysis": context,
@@ -197,20 +608,7 @@ class NLPProcessor:
     def _correct_spelling(self, text):
         """Correct spelling mistakes in the input text with improved handling"""
         # Words to preserve (don't correct these)
-        preserve_words = {
-            # Programming terms
-            'python', 'java', 'javascript', 'cpp', 'html', 'css', 'sql',
-            'api', 'json', 'xml', 'npm', 'git', 'docker', 'kubernetes',
-            # Common abbreviations
-            'ai', 'ml', 'nlp', 'api', 'gui', 'cli', 'sdk', 'ide',
-            # Technical terms
-            'regex', 'async', 'sync', 'crud', 'dom', 'url', 'uri',
-            # File extensions
-            'txt', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'csv',
-            # Common names and brands
-            'google', 'microsoft', 'apple', 'linux', 'windows', 'mac',
-            'chrome', 'firefox', 'safari', 'edge', 'vscode'
-        }
+        preserve_words = PRESERVE_WORDS
 
         words = text.split()
         corrected_words = []
@@ -244,91 +642,237 @@ class NLPProcessor:
             'corrections_made': corrections_made
         }
     
+    def _correct_command_spelling(self, text, grammar=None):
+        """Correct misrecognized words against the command vocabulary.
+        
+        Uses the symmetric-delete index, so it is cheap enough to run on every
+        utterance. Short words allow one edit, longer ones two. Words the
+        spell checker knows as English are left alone: "quiz" is not a
+        misheard "quit".
+        """
+        corrected_words = []
+        corrections_made = False
+        
+        for word in text.split():
+            correction = self._correct_command_word(word, grammar)
+            if correction:
+                corrected_words.append(correction)
+                corrections_made = True
+            else:
+                corrected_words.append(word)
+        
+        return {
+            'corrected_text': ' '.join(corrected_words),
+            'original_text': text,
+            'corrections_made': corrections_made
+        }
+    
+    def _correct_command_word(self, word, grammar=None):
+        """Closest vocabulary word for a misrecognized word, or None"""
+        spelling_index = (grammar or self.grammar).spelling_index
+        word_lower = word.lower()
+        if (len(word_lower) < 3 or not word_lower.isalpha()
+                or word_lower in spelling_index or word_lower in self.spell):
+            return None
+        max_distance = 1 if len(word_lower) <= 6 else 2
+        match = spelling_index.lookup(word_lower, max_distance)
+        return match[0] if match else None
+    
     def classify_input(self, text):
-        """Enhanced classification with improved app command handling"""
-        # Process the text
-        tokens = self.preprocess_text(text)
-        entities = self.extract_entities(text)
-        pos_tags = self.get_pos_tags(text)
-        doc = self.nlp(text)
-        
-        # Check for app commands first
+        """Enhanced classification with improved app command handling.
+        
+        Results are memoized per whitespace-normalized input and shared
+        between callers, so treat them as read-only. spaCy only runs for
+        inputs the rule tiers cannot decide (see CLASSIFY_TIERS).
+        """
+        with metrics.timer(CLASSIFY_METRIC, stage='total'):
+            text = normalize_input(text)
+            grammar = self.grammar
+            return self.classification_cache.get_or_compute(
+                self._classification_key(text, grammar),
+                lambda: self._classify(self.analyze(text, lazy=True), grammar),
+                tags=(pattern_key(text),)
+            )
+    
+    def incremental(self, stable_updates=2):
+        """Start classifying an utterance from streaming transcript prefixes"""
+        from Processing.incremental_classifier import IncrementalClassifier
+        return IncrementalClassifier(self, stable_updates)
+    
+    def classify_batch(self, texts, batch_size=32, n_process=1):
+        """Classify many texts, parsing the uncached ones together with nlp.pipe"""
+        texts = [normalize_input(text) for text in texts]
+        grammar = self.grammar
+        results = [
+            self.classification_cache.get(self._classification_key(text, grammar))
+            for text in texts
+        ]
+        
+        # Classify each distinct uncached text once
+        missing = list(dict.fromkeys(
+            text for text, result in zip(texts, results) if result is None
+        ))
+        # Taken before classifying, so feedback recorded meanwhile wins
+        generations = {
+            text: self.classification_cache.generation((pattern_key(text),))
+            for text in missing
+        }
+        # Score every missing text against the command table in one pass
+        matches = dict(zip(missing, grammar.matcher.best_match_batch(missing)))
+        classified = {}
+        unparsed = {}
+        for text in missing:
+            analysis = TextAnalysis(text, parse=self._parse)
+            analysis.features['command_match'] = matches[text]
+            result = self._classify(analysis, grammar, max_tier=1)
+            if result is None:
+                unparsed[text] = analysis
+            else:
+                classified[text] = result
+        
+        # Only texts the rule tiers could not decide go through nlp.pipe
+        if unparsed:
+            parsed = self.analyze_batch(list(unparsed), batch_size, n_process)
+            for text, parsed_analysis in zip(unparsed, parsed):
+                analysis = unparsed[text]
+                analysis.set_doc(parsed_analysis.doc, parsed_analysis.tokens)
+                classified[text] = self._classify(analysis, grammar)
+        
+        for text, result in classified.items():
+            self.classification_cache.set(
+                self._classification_key(text, grammar), result,
+                tags=(pattern_key(text),), generation=generations[text]
+            )
+        return [
+            result if result is not None else classified[text]
+            for text, result in zip(texts, results)
+        ]
+    
+    def _classification_key(self, text, grammar=None):
+        # The grammar version keeps results computed against an old
+        # command table from being stored under a current key
+        return ('classify', (grammar or self.grammar).version, text)
+    
+    def _classify(self, analysis, grammar=None, max_tier=2):
+        """Classify an utterance against one grammar version, cheapest tier first.
+        
+        Returns None if no tier up to max_tier could decide.
+        """
+        grammar = grammar or self.grammar
+        start = time.perf_counter()
+        spelling = analysis.features.get('spelling')
+        if spelling is None:
+            # Fix misrecognized command words ("brigthness up") before matching
+            with metrics.timer(CLASSIFY_METRIC, stage='spelling'):
+                spelling = self._correct_command_spelling(analysis.text, grammar)
+            analysis.features['spelling'] = spelling
+        
+        if 'rule_result' not in analysis.features:
+            analysis.features['rule_result'] = self._classify_rules(analysis, spelling, grammar)
+        result = analysis.features['rule_result']
+        if result is None:
+            if max_tier < 2:
+                return None
+            result = self._classify_analysis(analysis, grammar)
+            result['tier'] = 2
+        
+        result['spelling'] = spelling
+        with self._tier_lock:
+            self.tier_counts[result['tier']] += 1
+        metrics.registry.observe(TIER_METRIC, time.perf_counter() - start,
+                                 tier=str(result['tier']))
+        return result
+    
+    def _classify_rules(self, analysis, spelling, grammar):
+        """Tiers 0 and 1: decide a system command without the spaCy parse, or None"""
+        text = analysis.text
+        command_text = spelling['corrected_text'] if spelling['corrections_made'] else text
+        
+        # Check for app commands first, on what was actually said: a
+        # corrected word alone must never launch or close an app
         text_parts = text.lower().split()
-        if len(text_parts) >= 2 and text_parts[0] in self.system_commands['app']:
+        if len(text_parts) >= 2 and text_parts[0] in grammar.app_verbs:
             return {
                 'type': 'system',
                 'category': 'app',
                 'command': text,  # Use full text as command
                 'confidence': 0.9,
+                'tier': 0,
                 'context': {
                     'word_similarity': 0.9,
                     'sequence_similarity': 0.9,
                     'context_score': 0.9,
-                    'relevant_entities': [e for e, _ in entities]
+                    'relevant_entities': []
                 }
             }
         
-        # Check for system commands first
-        highest_confidence = 0
-        matched_command = None
-        matched_category = None
-        
-        for category, commands in self.system_commands.items():
-            for cmd in commands:
-                confidence = self._sequence_match(cmd, text)
-                if confidence > highest_confidence:
-                    highest_confidence = confidence
-                    matched_command = cmd
-                    matched_category = category
+        # A grammar phrase said as is needs no fuzzy matching
+        exact = grammar.exact_match(text)
+        if exact is None and spelling['corrections_made']:
+            exact = grammar.exact_match(command_text)
+        if exact is not None:
+            tier = 0
+            matched_category, matched_command = exact
+            highest_confidence = 1.0
+        else:
+            tier = 1
+            with metrics.timer(CLASSIFY_METRIC, stage='command_match'):
+                matched_category, matched_command, highest_confidence = \
+                    analysis.features.get('command_match') or grammar.matcher.best_match(text)
+                if spelling['corrections_made']:
+                    corrected_match = grammar.matcher.best_match(command_text)
+                    if corrected_match[2] > highest_confidence:
+                        matched_category, matched_command, highest_confidence = corrected_match
         
         # Apply learned confidence adjustments
-        pattern = text.lower()
-        if pattern in self.interaction_history["confidence_adjustments"]:
-            learned_confidence = self.interaction_history["confidence_adjustments"][pattern]
+        learned_confidence = self.learning_store.learned_confidence(pattern_key(text))
+        if learned_confidence is not None:
             highest_confidence = (highest_confidence + learned_confidence) / 2
         
         # If high confidence in system command
-        if highest_confidence > 0.6:
-            context_score = self._calculate_context_score(
-                matched_category, 
-                text, 
-                entities, 
-                pos_tags
-            )
-            return {
-                'type': 'system',
-                'category': matched_category,
-                'command': matched_command,
-                'confidence': highest_confidence,
-                'context': {
-                    'word_similarity': highest_confidence,
-                    'sequence_similarity': self._sequence_match(matched_command, text),
-                    'context_score': context_score,
-                    'relevant_entities': [e for e, _ in entities]
-                }
+        if highest_confidence <= 0.6:
+            return None
+        with metrics.timer(CLASSIFY_METRIC, stage='context_score'):
+            context_score = self._keyword_context_score(matched_category, analysis)
+        return {
+            'type': 'system',
+            'category': matched_category,
+            'command': matched_command,
+            'confidence': highest_confidence,
+            'tier': tier,
+            'context': {
+                'word_similarity': highest_confidence,
+                'sequence_similarity': self._sequence_match(matched_command, text, grammar),
+                'context_score': context_score,
+                'relevant_entities': []
             }
-        
+        }
+    
+    def _classify_analysis(self, analysis, grammar):
+        """Tier 2: generation or unclear, from the full spaCy analysis"""
         # Check for generation request
-        generation_score = self._calculate_generation_score(text, tokens, doc)
+        with metrics.timer(CLASSIFY_METRIC, stage='generation_score'):
+            generation_score = self._calculate_generation_score(analysis, grammar)
         if generation_score > 0.3:  # Lower threshold for better question detection
             return {
                 'type': 'generation',
                 'confidence': generation_score,
-                'intent': self._determine_generation_intent(doc),
+                'intent': self._determine_generation_intent(analysis.doc),
                 'context': {
                     'generation_type': 'text',
-                    'key_phrases': [token for token in tokens if len(token) > 3]
+                    'key_phrases': analysis.key_phrases()
                 }
             }
         
         # If no clear classification, return suggestions
-        suggestions = self._get_enhanced_suggestions(text, tokens, entities, pos_tags)
+        with metrics.timer(CLASSIFY_METRIC, stage='suggestions'):
+            suggestions = self._get_enhanced_suggestions(analysis, grammar)
         return {
             'type': 'unclear',
             'suggestions': suggestions,
             'context': {
                 'possible_intents': [s['category'] for s in suggestions],
-                'key_phrases': [token for token in tokens if len(token) > 3]
+                'key_phrases': analysis.key_phrases()
             }
         }
     
@@ -341,10 +885,8 @@ class NLPProcessor:
             correction=correction
         )
     
-    def _sequence_match(self, cmd, text):
+    def _sequence_match(self, cmd, text, grammar=None):
         """Calculate sequence matching score with improved app command handling"""
-        import difflib
-        
         # Convert to lowercase for comparison
         text_lower = text.lower()
         cmd_lower = cmd.lower()
@@ -353,7 +895,7 @@ class NLPProcessor:
         text_parts = text_lower.split()
         cmd_parts = cmd_lower.split()
         
-        if len(text_parts) >= 2 and text_parts[0] in self.system_commands['app']:
+        if len(text_parts) >= 2 and text_parts[0] in (grammar or self.grammar).app_verbs:
             # If this is an app command (e.g., "open whatsapp")
             if text_parts[0] == cmd_parts[0]:  # If the action matches (e.g., "open")
                 return 0.9  # High confidence for app commands
@@ -363,78 +905,63 @@ class NLPProcessor:
         matcher = difflib.SequenceMatcher(None, cmd_lower, text_lower)
         return matcher.ratio()
     
-    def _calculate_context_score(self, category, text, entities, pos_tags):
-        """Calculate context relevance score"""
-        score = 0.0
-        
-        # Category-specific keywords
-        category_keywords = {
-            'volume': ['sound', 'audio', 'speaker', 'loud', 'quiet'],
-            'brightness': ['screen', 'display', 'dim', 'light', 'dark'],
-            'power': ['system', 'computer', 'device', 'machine'],
-            # Add more categories...
-        }
+    def _calculate_context_score(self, category, analysis):
+        """Calculate context relevance score, once per category and utterance"""
+        scores = analysis.features.setdefault('context_scores', {})
+        score = scores.get(category)
+        if score is not None:
+            return score
         
         # Check for category-specific keywords
-        if category in category_keywords:
-            keywords = set(category_keywords[category])
-            text_words = set(text.lower().split())
-            keyword_matches = keywords.intersection(text_words)
-            score += len(keyword_matches) * 0.2
+        score = self._context_keyword_hits(analysis).get(category, 0) * 0.2
         
         # Check for relevant entities
-        for entity, label in entities:
-            if self._is_relevant_entity(entity, category):
-                score += 0.15
+        score += len(self._relevant_entities(analysis, category)) * 0.15
         
         # Check for relevant POS patterns
-        score += self._check_pos_patterns(pos_tags, category) * 0.15
+        score += self._check_pos_patterns(analysis, category) * 0.15
         
-        return min(score, 1.0)  # Normalize to max 1.0
+        scores[category] = score = min(score, 1.0)  # Normalize to max 1.0
+        return score
+    
+    def _keyword_context_score(self, category, analysis):
+        """Context score from category keywords alone, which needs no parse"""
+        return min(self._context_keyword_hits(analysis).get(category, 0) * 0.2, 1.0)
+    
+    def _context_keyword_hits(self, analysis):
+        """Count distinct context keywords per category, once per utterance"""
+        hits = analysis.features.get('context_keyword_hits')
+        if hits is None:
+            hits = defaultdict(int)
+            for word in analysis.words:
+                for category in CONTEXT_KEYWORD_INDEX.get(word, ()):
+                    hits[category] += 1
+            analysis.features['context_keyword_hits'] = hits
+        return hits
     
-    def _calculate_generation_score(self, text, tokens, doc):
+    def _calculate_generation_score(self, analysis, grammar=None):
         """Calculate generation request confidence with improved detection"""
         score = 0.0
-        
-        # Expanded generation indicators
-        generation_indicators = {
-            'high': [
-                'tell', 'explain', 'write', 'generate', 'create', 'make', 'show',
-                'describe', 'elaborate', 'define', 'what', 'how', 'why', 'when',
-                'who', 'where', 'which'
-            ],
-            'medium': [
-                'is', 'are', 'was', 'were', 'will', 'can', 'could', 'would',
-                'should', 'may', 'might', 'do', 'does', 'did', 'mean', 'work',
-                'function', 'help', 'guide', 'teach'
-            ],
-            'low': [
-                'the', 'a', 'an', 'any', 'some', 'many', 'few', 'about',
-                'like', 'similar', 'different', 'other'
-            ]
-        }
+        text = analysis.text
+        tokens = analysis.tokens
+        doc = analysis.doc
         
         # Convert text to lowercase for matching
-        text_lower = text.lower()
+        text_lower = analysis.text_lower
         
         # Check for question marks (highest priority)
         if '?' in text:
             score += 0.5
         
         # Check for question words at the start
-        first_word = text_lower.split()[0] if text_lower else ''
-        if first_word in generation_indicators['high']:
+        words = text_lower.split()
+        first_word = words[0] if words else ''
+        if first_word in QUESTION_START_WORDS:
             score += 0.4
         
         # Check tokens against indicators
         for token in tokens:
-            token_lower = token.lower()
-            if token_lower in generation_indicators['high']:
-                score += 0.3
-            elif token_lower in generation_indicators['medium']:
-                score += 0.2
-            elif token_lower in generation_indicators['low']:
-                score += 0.1
+            score += GENERATION_WEIGHTS.get(token.lower(), 0.0)
         
         # Check for question structure
         if self._is_question_structure(doc):
@@ -452,64 +979,52 @@ class NLPProcessor:
         score = min(score, 1.0)
         
         # If it's clearly not a system command and has some words, boost the score
-        if score > 0.2 and not any(
-            cmd in text_lower 
-            for cmds in self.system_commands.values() 
-            for cmd in cmds
-        ):
+        automaton = (grammar or self.grammar).automaton
+        if score > 0.2 and not automaton.contains_any(text_lower):
             score += 0.2
             score = min(score, 1.0)
         
         return score
     
-    def _get_enhanced_suggestions(self, text, tokens, entities, pos_tags):
+    def _get_enhanced_suggestions(self, analysis, grammar=None):
         """Get improved command suggestions"""
-        suggestions = []
-        
-        # Get base suggestions
-        base_suggestions = self._get_suggestions(text)
+        suggestions = self._get_suggestions(analysis.text, grammar)
         
         # Enhance with context
-        for suggestion in base_suggestions:
-            confidence = self._calculate_context_score(
-                suggestion['category'],
-                text,
-                entities,
-                pos_tags
-            )
-            suggestion['confidence'] = confidence
+        for suggestion in suggestions:
+            category = suggestion['category']
+            suggestion['confidence'] = self._calculate_context_score(category, analysis)
             suggestion['context'] = {
-                'relevant_entities': [
-                    e for e in entities 
-                    if self._is_relevant_entity(e[0], suggestion['category'])
-                ],
-                'pos_pattern': self._check_pos_patterns(
-                    pos_tags, 
-                    suggestion['category']
-                )
+                'relevant_entities': self._relevant_entities(analysis, category),
+                'pos_pattern': self._check_pos_patterns(analysis, category)
             }
-            suggestions.append(suggestion)
         
-        # Sort by confidence
-        suggestions.sort(key=lambda x: x['confidence'], reverse=True)
-        return suggestions[:3]
+        # Best confidence first; ties keep command table order
+        return heapq.nlargest(3, suggestions, key=itemgetter('confidence'))
     
-    def _get_suggestions(self, text):
+    def _get_suggestions(self, text, grammar=None):
         """Get possible command suggestions for unclear input"""
-        suggestions = []
+        grammar = grammar or self.grammar
         tokens = set(text.lower().split())
         
-        # Look for partial matches
-        for category, commands in self.system_commands.items():
-            for command in commands:
-                command_tokens = set(command.split())
-                if any(token in tokens for token in command_tokens):
-                    suggestions.append({
-                        'category': category,
-                        'command': command
-                    })
+        # Look for partial matches through the word index
+        matched = set()
+        for token in tokens:
+            matched.update(grammar.token_index.get(token, ()))
         
-        return suggestions[:3]  # Return top 3 suggestions
+        # Return the top 3 suggestions in command table order. An alias and
+        # its phrase name the same command, so only count it once.
+        entries = grammar.matcher.entries
+        suggestions = []
+        seen = set()
+        for idx in sorted(matched):
+            category, cmd, _ = entries[idx]
+            if (category, cmd) not in seen:
+                seen.add((category, cmd))
+                suggestions.append({'category': category, 'command': cmd})
+                if len(suggestions) == 3:
+                    break
+        return suggestions
     
     def _determine_generation_intent(self, doc):
         """Determine the specific generation intent"""
@@ -556,71 +1071,54 @@ class NLPProcessor:
         
         return has_question_structure
     
-    def _check_pos_patterns(self, pos_tags, category):
-        """Check for relevant POS patterns based on category"""
-        score = 0.0
-        
-        # Category-specific POS patterns
-        patterns = {
-            'volume': ['VERB', 'NOUN'],  # e.g., "increase volume"
-            'brightness': ['VERB', 'NOUN'],  # e.g., "adjust brightness"
-            'power': ['VERB'],  # e.g., "shutdown"
-            'app': ['VERB', 'PROPN'],  # e.g., "open Chrome"
-            # Add more patterns as needed
-        }
-        
-        if category in patterns:
-            expected_pattern = patterns[category]
-            pos_sequence = [tag for _, tag in pos_tags]
-            
-            # Check if the expected pattern appears in the sequence
-            for i in range(len(pos_sequence) - len(expected_pattern) + 1):
-                if pos_sequence[i:i+len(expected_pattern)] == expected_pattern:
-                    score += 1.0
-                    break
-        
-        return min(score, 1.0)
-    
-    def _is_relevant_entity(self, entity, category):
-        """Check if entity is relevant for the given category"""
-        # Category-specific relevant entity types
-        relevant_entities = {
-            'app': ['PRODUCT', 'ORG', 'GPE'],  # Software names, organizations
-            'file': ['FILE', 'PATH'],  # File names and paths
-            'network': ['ORG', 'GPE'],  # Network names, locations
-            'security': ['ORG', 'PERSON'],  # Security-related entities
-            # Add more categories as needed
-        }
-        
-        if category in relevant_entities:
-            return any(entity.lower() in self.system_commands[category])
+    def _check_pos_patterns(self, analysis, category):
+        """1.0 if the category's POS pattern occurs in the utterance, else 0.0"""
+        pattern = POS_PATTERNS.get(category)
+        if pattern is None:
+            return 0.0
         
-        return False
+        # Every POS n-gram of the lengths in use, collected once per utterance
+        ngrams = analysis.features.get('pos_ngrams')
+        if ngrams is None:
+            tags = [tag for _, tag in analysis.pos_tags]
+            ngrams = {
+                tuple(tags[i:i + n])
+                for n in POS_PATTERN_LENGTHS
+                for i in range(len(tags) - n + 1)
+            }
+            analysis.features['pos_ngrams'] = ngrams
+        return 1.0 if pattern in ngrams else 0.0
+    
+    def _relevant_entities(self, analysis, category):
+        """(text, label) of the entities whose label supports the category"""
+        labels = ENTITY_LABELS.get(category)
+        if not labels:
+            return []
+        return [entity for entity in analysis.entities if entity[1] in labels]
+
     
     def _load_learning_data(self):
-        """Load previous learning data if it exists"""
-        if os.path.exists(self.learning_file):
-            try:
-                with open(self.learning_file, 'r') as f:
-                    return json.load(f)
-            except:
-                return {
-                    "command_patterns": {},
-                    "user_corrections": [],
-                    "successful_commands": [],
-                    "confidence_adjustments": {}
-                }
+        """Load previous learning data if it exists.
+        
+        Only the learned tables are replayed; past interactions stay in the
+        store's history log. The lists below are ring buffers holding the
+        most recent records of this session.
+        """
+        self.learning_store.load()
+        # Older stores keyed patterns by the raw lowercased input
+        state = self.learning_store.rekey(migrate_pattern_key)
+        recent_limit = self.learning_store.recent_limit
         return {
-            "command_patterns": {},
-            "user_corrections": [],
-            "successful_commands": [],
-            "confidence_adjustments": {}
+            "command_patterns": state["command_patterns"],
+            "user_corrections": deque(maxlen=recent_limit),
+            "successful_commands": deque(maxlen=recent_limit),
+            "confidence_adjustments": state["confidence_adjustments"],
+            "pattern_stats": state["pattern_stats"]
         }
     
     def _save_learning_data(self):
-        """Save learning data to file"""
-        with open(self.learning_file, 'w') as f:
-            json.dump(self.interaction_history, f, indent=2)
+        """Snapshot learning data to file"""
+        self.learning_store.compact()
     
     def record_interaction(self, input_text, classification, success=None, correction=None):
         """Record interaction for learning"""
@@ -628,32 +1126,54 @@ class NLPProcessor:
         interaction = {
             "timestamp": timestamp,
             "input": input_text,
-            "classification": classification,
+            "classification": self._summarize_classification(classification),
             "success": success,
             "correction": correction
         }
+        pattern = pattern_key(input_text)
+        new_confidence = None
         
         # Update pattern confidence based on success/failure
         if success is not None:
-            pattern = input_text.lower()
-            current_confidence = self.interaction_history["confidence_adjustments"].get(pattern, 0.5)
+            current_confidence = self.learning_store.learned_confidence(pattern)
+            if current_confidence is None:
+                current_confidence = 0.5
             
             if success:
                 # Increase confidence for successful patterns
                 new_confidence = min(1.0, current_confidence + 0.1)
                 self.interaction_history["successful_commands"].append(interaction)
+                self.learning_store.append_history("interaction", interaction)
             else:
                 # Decrease confidence for failed patterns
                 new_confidence = max(0.0, current_confidence - 0.05)
             
-            self.interaction_history["confidence_adjustments"][pattern] = new_confidence
-        
         # Record corrections for learning
         if correction:
-            self.interaction_history["user_corrections"].append({
+            record = {
                 "original": input_text,
                 "correction": correction,
                 "timestamp": timestamp
-            })
+            }
+            self.interaction_history["user_corrections"].append(record)
+            self.learning_store.append_history("correction", record)
         
-        self._save_learning_data()
\ No newline at end of file
+        # Fold the event into the per-pattern counters. This is journaled, so
+        # it appends a line instead of rewriting the store.
+        if success is not None or correction:
+            evicted = self.learning_store.update_pattern(
+                pattern,
+                confidence=new_confidence,
+                success=success,
+                correction=bool(correction),
+                timestamp=timestamp
+            )
+            
+            # Cached results were computed with the old adjustments
+            for stale in [pattern] + evicted:
+                self.classification_cache.invalidate_tag(stale)
+    
+    def _summarize_classification(self, classification):
+        """Keep only the fields worth storing with an interaction"""
+        keys = ('type', 'category', 'command', 'intent', 'confidence')
+        return {key: classification[key] for key in keys if key in classification}
\ No newline at end of file
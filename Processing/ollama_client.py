@@ -0,0 +1,250 @@
+import codecs
+import json
+import os
+import subprocess
+import tempfile
+import threading
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # The CLI backend still works without it
+    requests = None
+
+DEFAULT_MODEL = "llama3.2"
+DEFAULT_HOST = "http://127.0.0.1:11434"
+
+
+class OllamaError(RuntimeError):
+    """The model could not produce a response"""
+
+
+def normalize_host(host):
+    """Accept OLLAMA_HOST forms like "0.0.0.0:11434" as well as full URLs"""
+    host = (host or DEFAULT_HOST).rstrip('/')
+    if '://' not in host:
+        host = f"http://{host}"
+    if host.count(':') < 2:
+        host += ":11434"
+    return host
+
+
+class OllamaClient:
+    """Client for a local Ollama server's HTTP API.
+
+    Requests go over a pooled keep-alive ``requests.Session``, so after the
+    first call a generation costs one HTTP round trip instead of starting
+    the ``ollama`` CLI. ``options`` (temperature, num_ctx, ...) are sent
+    with every request and can be overridden per call. ``connect_timeout``
+    bounds reaching the server; ``read_timeout`` bounds the wait for the
+    model's answer.
+    """
+
+    def __init__(self, host=None, model=DEFAULT_MODEL, options=None, keep_alive=None,
+                 connect_timeout=3.0, read_timeout=120.0, pool_size=4):
+        if requests is None:
+            raise ImportError("OllamaClient requires the 'requests' package")
+        self.host = normalize_host(host)
+        self.model = model
+        self.options = dict(options or {})
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Created on first use, so a process forked before any request
+        # never shares the parent's sockets
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    def _payload(self, prompt, model, system, context, options, stream):
+        payload = {"model": model or self.model, "prompt": prompt, "stream": stream}
+        if system:
+            payload["system"] = system
+        if context:
+            payload["context"] = context
+        merged = {**self.options, **(options or {})}
+        if merged:
+            payload["options"] = merged
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _post(self, path, payload, stream=False):
+        try:
+            response = self.session.post(
+                f"{self.host}{path}", json=payload, timeout=self.timeout, stream=stream
+            )
+        except requests.RequestException as e:
+            raise OllamaError(f"Ollama request failed: {e}") from e
+        if response.status_code != 200:
+            try:
+                detail = response.json().get("error", response.text)
+            except ValueError:
+                detail = response.text
+            response.close()
+            raise OllamaError(f"Ollama returned {response.status_code}: {detail}")
+        return response
+
+    def generate(self, prompt, model=None, system=None, context=None, options=None):
+        """Complete prompt; returns Ollama's response object (text under "response")"""
+        payload = self._payload(prompt, model, system, context, options, stream=False)
+        response = self._post("/api/generate", payload)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise OllamaError(f"Malformed response from Ollama: {e}") from e
+
+    def generate_stream(self, prompt, model=None, system=None, context=None, options=None):
+        """Yield Ollama's response chunks as the model produces them.
+
+        Each chunk carries the next piece of text under "response"; the last
+        one has "done" set and the statistics and context of the whole reply.
+        """
+        payload = self._payload(prompt, model, system, context, options, stream=True)
+        response = self._post("/api/generate", payload, stream=True)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except ValueError as e:
+                    raise OllamaError(f"Malformed chunk from Ollama: {e}") from e
+                if "error" in chunk:
+                    raise OllamaError(chunk["error"])
+                yield chunk
+                if chunk.get("done"):
+                    break
+        except requests.RequestException as e:
+            raise OllamaError(f"Ollama stream failed: {e}") from e
+        finally:
+            response.close()
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class OllamaCLI:
+    """Runs ``ollama run`` once per request.
+
+    The original backend, kept for machines where the server API is not
+    reachable. The prompt goes to the CLI on stdin rather than the command
+    line. ``context`` and ``options`` are not supported by the CLI and are
+    ignored.
+    """
+
+    def __init__(self, model=DEFAULT_MODEL, command=("ollama",), timeout=120.0):
+        self.model = model
+        self.command = list(command)
+        self.timeout = timeout
+
+    def generate(self, prompt, model=None, system=None, context=None, options=None):
+        """Complete prompt; returns {"response": text} like OllamaClient.generate"""
+        if system:
+            prompt = f"{system}\n\n{prompt}"
+        model = model or self.model
+        try:
+            result = subprocess.run(
+                self.command + ["run", model], input=prompt,
+                capture_output=True, text=True, timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired as e:
+            raise OllamaError(f"ollama run timed out after {self.timeout}s") from e
+        except OSError as e:
+            raise OllamaError(f"Could not start ollama: {e}") from e
+        if result.returncode != 0:
+            raise OllamaError(result.stderr.strip() or f"ollama exited with {result.returncode}")
+        return {"model": model, "response": result.stdout, "done": True}
+
+    def generate_stream(self, prompt, model=None, system=None, context=None, options=None):
+        """Yield {"response": text} chunks as the CLI prints them, then a "done" chunk"""
+        if system:
+            prompt = f"{system}\n\n{prompt}"
+        model = model or self.model
+        # stderr goes to a file so a chatty CLI can never block on a full pipe
+        stderr = tempfile.TemporaryFile()
+        try:
+            process = subprocess.Popen(
+                self.command + ["run", model], stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE, stderr=stderr
+            )
+        except OSError as e:
+            stderr.close()
+            raise OllamaError(f"Could not start ollama: {e}") from e
+        # The CLI cannot time out on its own; kill it past the deadline
+        timer = threading.Timer(self.timeout, process.kill)
+        timer.start()
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        try:
+            process.stdin.write(prompt.encode("utf-8"))
+            process.stdin.close()
+            while True:
+                data = process.stdout.read1(4096)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield {"model": model, "response": text, "done": False}
+            process.wait()
+            if process.returncode != 0:
+                if not timer.is_alive():
+                    raise OllamaError(f"ollama run timed out after {self.timeout}s")
+                stderr.seek(0)
+                message = stderr.read().decode("utf-8", errors="replace").strip()
+                raise OllamaError(message or f"ollama exited with {process.returncode}")
+            yield {"model": model, "response": decoder.decode(b"", final=True), "done": True}
+        finally:
+            timer.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            stderr.close()
+
+    def close(self):
+        pass
+
+
+BACKENDS = {
+    "http": OllamaClient,
+    "cli": OllamaCLI
+}
+
+
+def client_from_env(model=DEFAULT_MODEL, backend=None):
+    """Generation backend configured by environment variables.
+
+    ASH_OLLAMA_BACKEND: "http" (default when requests is installed) or "cli"
+    OLLAMA_HOST: server address for the HTTP backend
+    ASH_OLLAMA_TIMEOUT: seconds to wait for an answer (default 120)
+    ASH_OLLAMA_OPTIONS: JSON object of model options, e.g. {"temperature": 0.2}
+    ASH_OLLAMA_KEEP_ALIVE: how long the server keeps the model loaded, e.g. "30m"
+    """
+    backend = backend or os.environ.get(
+        "ASH_OLLAMA_BACKEND", "http" if requests is not None else "cli"
+    )
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown Ollama backend {backend!r}; expected one of {sorted(BACKENDS)}")
+    timeout = float(os.environ.get("ASH_OLLAMA_TIMEOUT", "120"))
+    if backend == "cli":
+        return OllamaCLI(model, timeout=timeout)
+    return OllamaClient(
+        host=os.environ.get("OLLAMA_HOST"),
+        model=model,
+        options=json.loads(os.environ.get("ASH_OLLAMA_OPTIONS", "{}")),
+        keep_alive=os.environ.get("ASH_OLLAMA_KEEP_ALIVE"),
+        read_timeout=timeout
+    )
@@ -1,9 +1,18 @@
-import subprocess
-import json
+from Processing.ollama_client import OllamaError, client_from_env
 
 class OllamaGenerator:
-    def __init__(self, model_name="llama2"):
+    def __init__(self, model_name="llama2", client=None):
+        """client: OllamaClient or OllamaCLI; by default chosen by client_from_env"""
         self.model = model_name
+        self._client = client
+
+    @property
+    def client(self):
+        # Built on first use: NLPProcessor creates a generator even when it
+        # only ever classifies
+        if self._client is None:
+            self._client = client_from_env(self.model)
+        return self._client
 
     def generate_with_context(self, prompt, context=None):
         """Generate response using Ollama with context"""
@@ -14,18 +23,14 @@ class OllamaGenerator:
             else:
                 full_prompt = prompt
 
-            # Call Ollama using subprocess
-            cmd = ["ollama", "run", self.model, full_prompt]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                return result.stdout.strip()
-            else:
-                return f"Error generating response: {result.stderr}"
-                
+            result = self.client.generate(full_prompt, model=self.model)
+            return result.get("response", "").strip()
+
+        except OllamaError as e:
+            return f"Error generating response: {e}"
         except Exception as e:
             return f"Failed to generate response: {str(e)}"
 
     def generate(self, prompt):
         """Simple generation without context"""
-        return self.generate_with_context(prompt)
\ No newline at end of file
+        return self.generate_with_context(prompt)
@@ -0,0 +1,213 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    template TEXT NOT NULL,
+    intent TEXT NOT NULL,
+    query TEXT NOT NULL,
+    response TEXT NOT NULL,
+    latency REAL NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+
+def normalize_query(query):
+    """Lowercased words of a query without punctuation or extra whitespace"""
+    return ' '.join(re.findall(r"[a-z0-9']+", query.lower()))
+
+
+def response_key(model, template, intent, normalized):
+    text = '\0'.join((model, template, intent or '', normalized))
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Generated answers stored in SQLite, so they survive restarts.
+
+    Answers are keyed on model, prompt template, intent and the normalized
+    query, so "What is Python?" and "what is python" share one. With
+    ``similarity`` set, a query that misses can also be served the answer
+    to the closest cached query of the same model, template and intent if
+    the Jaccard similarity of their word sets reaches it. At most
+    ``max_entries`` answers are kept (least recently used go first), and
+    answers older than ``ttl`` seconds are regenerated.
+
+    Hits, near-duplicate hits, misses and bypasses are counted, along with
+    the generation time the hits saved, for ``stats()``.
+    """
+
+    def __init__(self, path="nlp_responses.sqlite3", max_entries=1000,
+                 ttl=7 * 24 * 3600, similarity=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(SCHEMA)
+        # (model, template, intent) -> word -> keys, for near-duplicate lookup
+        self._word_index = {}
+        self._words = {}  # key -> (group, frozenset of words)
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_seconds = 0.0
+        with self._lock:
+            self._expire()
+            for key, model, template, intent, query in self._db.execute(
+                    "SELECT key, model, template, intent, query FROM responses"):
+                self._index(key, (model, template, intent), query)
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._words)
+
+    def get(self, model, template, intent, query):
+        """Cached answer for query, or None"""
+        normalized = normalize_query(query)
+        key = response_key(model, template, intent, normalized)
+        with self._lock:
+            row = self._lookup(key)
+            near = False
+            if row is None and self.similarity is not None:
+                key = self._closest((model, template, intent or ''), normalized)
+                row = self._lookup(key) if key else None
+                near = row is not None
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, latency = row
+            self._db.execute(
+                "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                (time.time(), key)
+            )
+            self._db.commit()
+            if near:
+                self.near_hits += 1
+            else:
+                self.hits += 1
+            self.saved_seconds += latency
+            return response
+
+    def put(self, model, template, intent, query, response, latency):
+        """Store an answer that took latency seconds to generate"""
+        normalized = normalize_query(query)
+        key = response_key(model, template, intent, normalized)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, template, intent, query, response, latency, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, template, intent or '', normalized, response, latency, now, now)
+            )
+            self._index(key, (model, template, intent or ''), normalized)
+            self._evict()
+            self._db.commit()
+
+    def bypass(self):
+        """Count a generation that was not allowed to use the cache"""
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._word_index = {}
+            self._words = {}
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                'entries': len(self._words),
+                'hits': self.hits,
+                'near_hits': self.near_hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_ratio': round((self.hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+                'saved_seconds': round(self.saved_seconds, 3)
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _lookup(self, key):
+        row = self._db.execute(
+            "SELECT response, latency, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if self.ttl is not None and time.time() - row[2] > self.ttl:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            self._unindex(key)
+            return None
+        return row[0], row[1]
+
+    def _closest(self, group, normalized):
+        """Key of the most similar cached query in group, if similar enough"""
+        words = frozenset(normalized.split())
+        index = self._word_index.get(group)
+        if not words or not index:
+            return None
+        candidates = set()
+        for word in words:
+            candidates.update(index.get(word, ()))
+        best_key, best_score = None, self.similarity
+        for key in candidates:
+            other = self._words[key][1]
+            score = len(words & other) / len(words | other)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _index(self, key, group, normalized):
+        self._unindex(key)
+        words = frozenset(normalized.split())
+        self._words[key] = (group, words)
+        index = self._word_index.setdefault(group, {})
+        for word in words:
+            index.setdefault(word, set()).add(key)
+
+    def _unindex(self, key):
+        entry = self._words.pop(key, None)
+        if entry is None:
+            return
+        group, words = entry
+        index = self._word_index.get(group, {})
+        for word in words:
+            keys = index.get(word)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[word]
+
+    def _expire(self):
+        if self.ttl is None:
+            return
+        self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+
+    def _evict(self):
+        excess = len(self._words) - self.max_entries
+        if excess <= 0:
+            return
+        stale = [key for (key,) in self._db.execute(
+            "SELECT key FROM responses ORDER BY last_used LIMIT ?", (excess,)
+        )]
+        self._db.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in stale])
+        for key in stale:
+            self._unindex(key)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+from itertools import combinations
+
+INDEX_VERSION = 1
+
+
+def edit_distance(a, b, max_distance):
+    """Optimal string alignment distance, or max_distance + 1 if larger"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2]
+                    and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def deletes(word, max_distance):
+    """Every string reachable from word by deleting up to max_distance chars"""
+    variants = set()
+    for count in range(1, min(max_distance, len(word)) + 1):
+        for positions in combinations(range(len(word)), count):
+            variants.add(''.join(
+                char for i, char in enumerate(word) if i not in positions
+            ))
+    return variants
+
+
+class SpellingIndex:
+    """Symmetric-delete (SymSpell) spelling index over a small vocabulary.
+
+    Every vocabulary word is stored under itself and all of its deletions up
+    to ``max_distance``. A lookup only generates the deletions of the query
+    word and checks the few words that share one, instead of generating
+    every edit of the query against a full dictionary.
+    """
+
+    def __init__(self, words=(), max_distance=2, _deletes=None):
+        self.words = list(dict.fromkeys(word.lower() for word in words if word))
+        self.max_distance = max_distance
+        self.vocabulary = set(self.words)
+        if _deletes is not None:
+            self.deletes = _deletes
+        else:
+            self.deletes = {}
+            for rank, word in enumerate(self.words):
+                for variant in deletes(word, max_distance) | {word}:
+                    self.deletes.setdefault(variant, []).append(rank)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word.lower() in self.vocabulary
+
+    def lookup(self, word, max_distance=None):
+        """Return (closest word, distance), or None if nothing is close enough.
+
+        Ties go to the word that appears first in the vocabulary.
+        """
+        word = word.lower()
+        if word in self.vocabulary:
+            return word, 0
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+
+        candidates = set()
+        for variant in deletes(word, max_distance) | {word}:
+            candidates.update(self.deletes.get(variant, ()))
+
+        best = None
+        for rank in sorted(candidates):
+            distance = edit_distance(word, self.words[rank], max_distance)
+            if distance <= max_distance and (best is None or distance < best[1]):
+                best = (self.words[rank], distance)
+        return best
+
+    @staticmethod
+    def signature(words, max_distance):
+        """Fingerprint of the inputs an index was built from"""
+        digest = hashlib.sha1()
+        digest.update(f"{INDEX_VERSION}:{max_distance}:".encode())
+        digest.update("\n".join(word.lower() for word in words).encode())
+        return digest.hexdigest()
+
+    def save(self, path):
+        """Write the index to path atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "signature": self.signature(self.words, self.max_distance),
+                "max_distance": self.max_distance,
+                "words": self.words,
+                "deletes": self.deletes
+            }, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a saved index; returns (index, signature it was saved with)"""
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(data["words"], data["max_distance"], _deletes=data["deletes"]), data["signature"]
+
+    @classmethod
+    def load_or_build(cls, path, words, max_distance=2):
+        """Load the index saved at path, rebuilding it if the vocabulary changed"""
+        words = list(dict.fromkeys(word.lower() for word in words if word))
+        expected = cls.signature(words, max_distance)
+        if path and os.path.exists(path):
+            try:
+                index, signature = cls.load(path)
+                if signature == expected:
+                    return index
+            except (OSError, ValueError, KeyError):
+                pass
+
+        index = cls(words, max_distance)
+        if path:
+            try:
+                index.save(path)
+            except OSError:
+                pass
+        return index
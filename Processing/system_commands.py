@@ -10,6 +10,10 @@ from commands.display_commands import DisplayCommands
 from commands.input_commands import InputCommands
 from commands.security_commands import SecurityCommands
 from commands.accessibility_commands import AccessibilityCommands
+from Processing import metrics
+
+# Histogram of command handler run time, by category
+COMMAND_METRIC = 'ash_command_seconds'
 
 class SystemCommandExecutor:
     def __init__(self):
@@ -31,5 +35,6 @@ class SystemCommandExecutor:
     def execute_command(self, category, command):
         """Execute the system command based on category and command"""
         if category in self.command_handlers:
-            return self.command_handlers[category](command)
+            with metrics.timer(COMMAND_METRIC, category=category):
+                return self.command_handlers[category](command)
         return f"Unknown category: {category}" 
\ No newline at end of file
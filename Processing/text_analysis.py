@@ -0,0 +1,92 @@
+class TextAnalysis:
+    """Single parse of an utterance shared by every classification step.
+
+    Holds the spaCy Doc together with the views the scoring helpers read
+    (entities, POS tags, dependencies and preprocessed tokens), so the
+    pipeline runs once per utterance instead of once per helper.
+
+    Built with ``parse`` instead of a Doc, the analysis is lazy: the text
+    views are available at once and ``parse(text)`` is called for
+    ``(doc, tokens)`` only when a helper first reads a parsed view. Rule
+    based classification tiers never do, so they cost no model call.
+    """
+
+    def __init__(self, text, doc=None, tokens=None, parse=None):
+        self.text = text
+        self.text_lower = text.lower()
+        self.words = set(self.text_lower.split())
+        self._parse = parse
+        self._doc = None
+        self._tokens = None
+        self._entities = None
+        self._pos_tags = None
+        self._dependencies = None
+        if doc is not None:
+            self.set_doc(doc, tokens)
+        # Derived features memoized by the scoring helpers
+        self.features = {}
+
+    def set_doc(self, doc, tokens):
+        """Attach a Doc parsed elsewhere, e.g. by nlp.pipe"""
+        self._doc = doc
+        self._tokens = tokens
+        self._entities = [(ent.text, ent.label_) for ent in doc.ents]
+        self._pos_tags = [(token.text, token.pos_) for token in doc]
+        self._dependencies = None
+
+    @property
+    def parsed(self):
+        return self._doc is not None
+
+    def _ensure_parsed(self):
+        if self._doc is None:
+            self.set_doc(*self._parse(self.text))
+
+    @property
+    def doc(self):
+        self._ensure_parsed()
+        return self._doc
+
+    @property
+    def tokens(self):
+        self._ensure_parsed()
+        return self._tokens
+
+    @property
+    def entities(self):
+        self._ensure_parsed()
+        return self._entities
+
+    @property
+    def pos_tags(self):
+        self._ensure_parsed()
+        return self._pos_tags
+
+    @property
+    def has_dependencies(self):
+        """Whether the Doc carries a dependency parse (not with the parser disabled)"""
+        return self.doc.has_annotation("DEP")
+
+    @property
+    def dependencies(self):
+        if self._dependencies is None:
+            if not self.has_dependencies:
+                raise ValueError(
+                    "No dependency parse: the spaCy parser is disabled "
+                    "(NLPProcessor(trim_pipeline=True))"
+                )
+            self._dependencies = [(token.text, token.dep_, token.head.text)
+                                  for token in self.doc]
+        return self._dependencies
+
+    def key_phrases(self):
+        """Preprocessed tokens long enough to carry meaning"""
+        return [token for token in self.tokens if len(token) > 3]
+
+    def to_dict(self):
+        """JSON-serializable view used as generation context"""
+        return {
+            "entities": self.entities,
+            "pos_tags": self.pos_tags,
+            "preprocessed_tokens": self.tokens
+        }
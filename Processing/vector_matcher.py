@@ -0,0 +1,152 @@
+import difflib
+import math
+from collections import Counter
+
+from Processing.command_matcher import command_entries
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional; only this matcher needs it
+    np = None
+
+try:
+    from scipy import sparse
+except ImportError:  # fall back to a dense matrix
+    sparse = None
+
+
+def char_ngrams(text, ngram_range=(1, 3)):
+    """Character n-gram counts of text, padded so word edges count"""
+    padded = f" {text} "
+    low, high = ngram_range
+    grams = Counter()
+    for n in range(low, high + 1):
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            if gram.strip():
+                grams[gram] += 1
+    return grams
+
+
+class VectorCommandMatcher:
+    """Character n-gram TF-IDF matcher over the system command phrases.
+
+    Every phrase becomes one L2-normalized row of a phrase x n-gram matrix
+    (scipy sparse when available, dense numpy otherwise). An utterance is
+    scored against all phrases with one vector-matrix product, and a batch
+    with one matrix-matrix product, so the cost grows with the number of
+    n-grams rather than with Python loops over phrases.
+
+    Cosine scores are only used to shortlist ``shortlist`` phrases. The
+    shortlist is rescored with ``SequenceMatcher.ratio()``, so returned
+    scores are on the same scale as CommandMatcher and the 0.6 threshold.
+    This trades exactness for speed: when the best phrase by ratio falls
+    outside the cosine shortlist, the result differs from CommandMatcher.
+    With the default shortlist of 20, Testing/matcher_benchmark.py measures
+    on the shipped grammar about 1% different phrases, usually at a tied
+    score, and no changes at the threshold. On a 4000-phrase table it
+    measures 12% different phrases, 2% decided differently at the threshold
+    and scores at most 0.08 lower. That table runs about 20x faster than
+    CommandMatcher there. Use CommandMatcher where results must be exact.
+    """
+
+    def __init__(self, system_commands, aliases=None, ngram_range=(1, 3), shortlist=20):
+        if np is None:
+            raise ImportError("VectorCommandMatcher requires numpy (pip install numpy)")
+        self.ngram_range = ngram_range
+        self.shortlist = shortlist
+        self.entries = command_entries(system_commands, aliases)
+
+        phrase_grams = [char_ngrams(cmd_lower, ngram_range)
+                        for _, _, cmd_lower in self.entries]
+        document_frequency = Counter()
+        for grams in phrase_grams:
+            document_frequency.update(grams.keys())
+
+        # Smoothed idf, as in scikit-learn's TfidfVectorizer
+        total = len(self.entries)
+        self.vocabulary = {gram: i for i, gram in enumerate(sorted(document_frequency))}
+        self.idf = np.array([
+            math.log((1 + total) / (1 + document_frequency[gram])) + 1
+            for gram in sorted(document_frequency)
+        ], dtype=np.float32)
+
+        self.matrix = self._vectorize(phrase_grams)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _vectorize(self, grams_list):
+        """Rows of L2-normalized tf-idf weights, one per Counter of n-grams"""
+        rows, cols, values = [], [], []
+        for row, grams in enumerate(grams_list):
+            weights = [(self.vocabulary[gram], count * self.idf[self.vocabulary[gram]])
+                       for gram, count in grams.items() if gram in self.vocabulary]
+            norm = math.sqrt(sum(weight * weight for _, weight in weights))
+            if norm == 0:
+                continue  # nothing in common with any phrase
+            for col, weight in weights:
+                rows.append(row)
+                cols.append(col)
+                values.append(weight / norm)
+
+        shape = (len(grams_list), len(self.vocabulary))
+        if sparse is not None:
+            return sparse.csr_matrix(
+                (np.array(values, dtype=np.float32), (rows, cols)), shape=shape
+            )
+        matrix = np.zeros(shape, dtype=np.float32)
+        matrix[rows, cols] = values
+        return matrix
+
+    def cosine_scores(self, texts):
+        """Cosine similarity of each text to every phrase, as a texts x phrases array"""
+        queries = self._vectorize([char_ngrams(text.lower(), self.ngram_range)
+                                   for text in texts])
+        scores = queries @ self.matrix.T
+        return scores.toarray() if sparse is not None else scores
+
+    def _rescore(self, text_lower, row, k):
+        """Rescore the shortlisted phrases of one cosine row with ratio()"""
+        count = min(max(self.shortlist, k), len(self.entries))
+        if count == 0:
+            return []
+        if count < len(self.entries):
+            candidates = np.argpartition(-row, count - 1)[:count]
+        else:
+            candidates = np.arange(len(self.entries))
+
+        matcher = difflib.SequenceMatcher(None, '', text_lower)
+        scored = []
+        for idx in candidates:
+            if row[idx] <= 0:
+                continue
+            idx = int(idx)
+            matcher.set_seq1(self.entries[idx][2])
+            scored.append((-matcher.ratio(), idx))
+        # Best ratio first, ties to the phrase earlier in the table
+        scored.sort()
+        return [(self.entries[idx][0], self.entries[idx][1], -neg_score)
+                for neg_score, idx in scored[:k]]
+
+    def top_k_batch(self, texts, k=5):
+        """Top k (category, command, score) lists for many texts at once"""
+        texts = list(texts)
+        if not texts:
+            return []
+        scores = self.cosine_scores(texts)
+        return [self._rescore(text.lower(), scores[i], k)
+                for i, text in enumerate(texts)]
+
+    def top_k(self, text, k=5):
+        """Top k (category, command, score) for text, best first"""
+        return self.top_k_batch([text], k)[0]
+
+    def best_match(self, text):
+        """Return (category, command, score) like CommandMatcher.best_match"""
+        return self.best_match_batch([text])[0]
+
+    def best_match_batch(self, texts):
+        """best_match for many texts with a single matrix product"""
+        return [matches[0] if matches else (None, None, 0)
+                for matches in self.top_k_batch(texts, 1)]
@@ -0,0 +1,166 @@
+import gc
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from Processing import metrics
+
+# The processor the forked workers classify with. Set in the parent just
+# before forking so every worker inherits the already loaded models.
+_worker_nlp = None
+
+
+def _init_worker():
+    # Another parent thread may have held any lock at the moment of the
+    # fork (restart() forks from a running server), so start each worker
+    # with fresh ones
+    _worker_nlp.reset_after_fork()
+    metrics.registry = metrics.ObservationLog()
+
+
+def _classify_in_worker(text, timed):
+    # Stage timings travel back with the result and are recorded in the parent
+    metrics.registry.set_enabled(timed)
+    result = _worker_nlp.classify_input(text)
+    return result, metrics.registry.drain()
+
+
+def fork_available():
+    """True where worker processes can be forked (not on Windows)"""
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+class ClassificationPool:
+    """Pre-forked worker processes that run NLPProcessor.classify_input.
+
+    The parent loads spaCy, NLTK and the command tables once and then
+    forks ``workers`` processes, so the models are shared copy-on-write
+    instead of being loaded per worker. Classification is CPU-bound and
+    holds the GIL, so this is what lets one server use every core.
+
+    At most ``max_pending`` texts may be queued or running at once;
+    ``submit`` raises ``queue.Full`` beyond that so callers can shed load
+    instead of building an unbounded backlog. Where fork is unavailable,
+    or with ``workers=0``, texts are classified in the calling thread
+    with the same bound.
+
+    Each worker keeps its own classification cache and sees learning data
+    as it was at fork time. Stage timings recorded in a worker are
+    replayed into the parent's metrics registry with each result.
+    """
+
+    def __init__(self, nlp, workers=None, max_pending=64):
+        global _worker_nlp
+        self.nlp = nlp
+        self.max_pending = max_pending
+        self.pending = 0
+        self._in_flight = set()  # futures still counted in pending
+        self._lock = threading.Lock()
+        self._pool = None
+        self.workers = 0
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers > 0 and fork_available():
+            nlp.load_components()
+            _worker_nlp = nlp
+            # Move everything loaded so far out of the collector's reach so
+            # that collections in the workers do not touch (and copy) the
+            # shared pages
+            gc.collect()
+            gc.freeze()
+            self._pool = multiprocessing.get_context('fork').Pool(
+                workers, initializer=_init_worker
+            )
+            self.workers = workers
+
+    def submit(self, text):
+        """Queue text for classification and return a Future for the result"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                raise queue.Full(f"{self.pending} classifications already pending")
+            self.pending += 1
+            future = Future()
+            self._in_flight.add(future)
+
+        if self._pool is None:
+            try:
+                future.set_result(self.nlp.classify_input(text))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._release(future)
+            return future
+
+        def on_result(returned):
+            result, observations = returned
+            for name, seconds, labels in observations:
+                metrics.registry.observe(name, seconds, **labels)
+            self._release(future)
+            future.set_result(result)
+
+        def on_error(error):
+            self._release(future)
+            future.set_exception(error)
+
+        self._pool.apply_async(_classify_in_worker, (text, metrics.registry.enabled),
+                               callback=on_result, error_callback=on_error)
+        return future
+
+    def classify(self, text, timeout=None):
+        """Classify text in a worker, waiting up to timeout seconds.
+
+        Raises TimeoutError past the timeout. A worker that dies never
+        reports back, so the text then stops counting against max_pending.
+        """
+        future = self.submit(text)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            self._release(future)
+            raise TimeoutError(f"No classification within {timeout}s") from None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'pending': self.pending,
+                'max_pending': self.max_pending
+            }
+
+    def restart(self):
+        """Fork fresh workers from the parent's current state.
+
+        Used after the parent reloads its grammar. New work goes to the new
+        workers at once; work already queued finishes on the old ones.
+        """
+        if self._pool is None:
+            return
+        old_pool = self._pool
+        gc.collect()
+        gc.freeze()
+        self._pool = multiprocessing.get_context('fork').Pool(
+            self.workers, initializer=_init_worker
+        )
+        threading.Thread(target=self._retire, args=(old_pool,), daemon=True).start()
+
+    def close(self):
+        """Stop the workers once queued work is done"""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    @staticmethod
+    def _retire(pool):
+        pool.close()
+        pool.join()
+
+    def _release(self, future):
+        # Once per future, whether the worker or a timed-out caller gets here first
+        with self._lock:
+            if future in self._in_flight:
+                self._in_flight.discard(future)
+                self.pending -= 1
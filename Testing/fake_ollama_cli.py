@@ -0,0 +1,24 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+from Testing.fake_ollama_server import fake_reply
+
+# Seconds to wait before answering, like --latency on the fake server
+LATENCY = float(os.environ.get('FAKE_OLLAMA_LATENCY', '0'))
+
+
+def main():
+    """Mimics `ollama run MODEL [PROMPT]`, reading the prompt from stdin if not given"""
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] != 'run':
+        print("usage: fake_ollama_cli.py run MODEL [PROMPT]", file=sys.stderr)
+        sys.exit(1)
+    prompt = ' '.join(args[2:]) if len(args) > 2 else sys.stdin.read()
+    time.sleep(LATENCY)
+    print(fake_reply(prompt))
+
+if __name__ == "__main__":
+    main()
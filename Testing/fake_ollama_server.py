@@ -0,0 +1,172 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_reply(prompt):
+    """Deterministic answer for a prompt: a few sentences quoting the last question"""
+    lines = [line for line in prompt.strip().splitlines() if line.strip()]
+    questions = [line[len('Human:'):].strip() for line in lines if line.startswith('Human:')]
+    last = questions[-1] if questions else (lines[-1] if lines else '')
+    return (f"You asked: {last[:80]}. This answer comes from the fake Ollama server. "
+            f"It has no model behind it. Use it to test the generation path.")
+
+
+def fake_tokens(text):
+    """Split a reply into word-sized chunks the way a model streams it"""
+    words = text.split(' ')
+    return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+    disable_nagle_algorithm = True  # headers and body go out as separate writes
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/api/version':
+            self._send_json(200, {'version': 'fake'})
+        elif self.path == '/api/tags':
+            self._send_json(200, {'models': [{'name': self.server.model}]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': 'invalid JSON'})
+            return
+        if self.path != '/api/generate':
+            self._send_json(404, {'error': 'not found'})
+            return
+        if 'prompt' not in payload:
+            self._send_json(400, {'error': 'prompt is required'})
+            return
+        self.server.record(payload)
+
+        time.sleep(self.server.latency)
+        prompt = payload['prompt']
+        reply = self.server.reply or fake_reply(prompt)
+        # Token ids stand in for the model state Ollama hands back as context
+        context = list(payload.get('context') or []) + \
+            [len(word) for word in (prompt + ' ' + reply).split()]
+        final = {
+            'model': payload.get('model', self.server.model),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'done': True,
+            'context': context,
+            'prompt_eval_count': len(prompt.split()),
+            'eval_count': len(reply.split())
+        }
+
+        if payload.get('stream', True) is False:
+            self._send_json(200, dict(final, response=reply))
+            return
+
+        # Newline-delimited JSON chunks, as the real server streams them
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for token in fake_tokens(reply):
+            time.sleep(self.server.token_delay)
+            self._write_chunk({'model': final['model'], 'response': token, 'done': False})
+        self._write_chunk(dict(final, response=''))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, body):
+        data = (json.dumps(body) + "\n").encode('utf-8')
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Stand-in for a local Ollama server implementing /api/generate.
+
+    Answers every prompt with ``reply`` (or a canned answer quoting the
+    prompt) after ``latency`` seconds, streaming it word by word with
+    ``token_delay`` between words when asked to. Received payloads are
+    kept in ``requests`` for inspection.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, model='llama3.2', reply=None,
+                 latency=0.0, token_delay=0.0, verbose=False):
+        super().__init__((host, port), _Handler)
+        self.model = model
+        self.reply = reply
+        self.latency = latency
+        self.token_delay = token_delay
+        self.verbose = verbose
+        self.requests = []
+        self._requests_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record(self, payload):
+        with self._requests_lock:
+            self.requests.append(payload)
+
+    def start(self):
+        """Serve from a background thread; returns self"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for tests and benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help="seconds to wait before answering")
+    parser.add_argument('--token-delay', type=float, default=0.0,
+                        help="seconds between streamed words")
+    parser.add_argument('--reply', default=None, help="fixed answer for every prompt")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, reply=args.reply, latency=args.latency,
+                              token_delay=args.token_delay, verbose=args.verbose)
+    print(f"Fake Ollama server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import random
+import time
+
+from Processing.command_grammar import CommandGrammar
+from Processing.command_matcher import CommandMatcher
+from Processing.vector_matcher import VectorCommandMatcher
+
+EXTRA_WORDS = ['alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf',
+               'hotel', 'india', 'juliet', 'kilo', 'lima']
+
+
+def utterances(words, count, rng):
+    """Random one to four word utterances, some words missing a letter"""
+    def mishear(word):
+        if len(word) > 3 and rng.random() < 0.3:
+            i = rng.randrange(len(word))
+            return word[:i] + word[i + 1:]
+        return word
+    return [' '.join(mishear(rng.choice(words)) for _ in range(rng.randint(1, 4)))
+            for _ in range(count)]
+
+
+def synthetic_table(words, phrases, rng, categories=40):
+    """A command table of distinct one to three word phrases"""
+    table = {f"category{i}": [] for i in range(categories)}
+    seen = set()
+    while len(seen) < phrases:
+        phrase = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 3)))
+        if phrase not in seen:
+            seen.add(phrase)
+            table[f"category{rng.randrange(categories)}"].append(phrase)
+    return table
+
+
+def compare(system_commands, texts, shortlist):
+    """Latency and disagreement of VectorCommandMatcher against CommandMatcher"""
+    exact = CommandMatcher(system_commands)
+    start = time.perf_counter()
+    expected = [exact.best_match(text) for text in texts]
+    exact_ms = (time.perf_counter() - start) / len(texts) * 1000
+
+    vector = VectorCommandMatcher(system_commands, shortlist=shortlist)
+    start = time.perf_counter()
+    actual = vector.best_match_batch(texts)
+    vector_ms = (time.perf_counter() - start) / len(texts) * 1000
+
+    return {
+        'phrases': len(exact),
+        'command_matcher_ms': round(exact_ms, 3),
+        'vector_ms': round(vector_ms, 3),
+        # A different phrase, often at the same score
+        'different_match': round(sum(a != b for a, b in zip(expected, actual)) / len(texts), 4),
+        # Decided differently at the 0.6 command threshold
+        'threshold_flips': round(sum((a[2] > 0.6) != (b[2] > 0.6)
+                                     for a, b in zip(expected, actual)) / len(texts), 4),
+        'max_score_gap': round(max(a[2] - b[2] for a, b in zip(expected, actual)), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="VectorCommandMatcher speed and agreement with CommandMatcher"
+    )
+    parser.add_argument('--utterances', type=int, default=500)
+    parser.add_argument('--phrases', type=int, default=4000,
+                        help="size of the synthetic command table")
+    parser.add_argument('--shortlist', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    grammar = CommandGrammar.load()
+    words = sorted({word for commands in grammar.system_commands.values()
+                    for cmd in commands for word in cmd.split()})
+    texts = utterances(words, args.utterances, rng)
+    large = synthetic_table(words + EXTRA_WORDS, args.phrases, rng)
+
+    print(json.dumps({
+        'shortlist': args.shortlist,
+        'utterances': len(texts),
+        'grammar': compare(grammar.system_commands, texts, args.shortlist),
+        'synthetic': compare(large, texts, args.shortlist)
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+
+from Processing import metrics
+
+
+def per_call_ns(block, iterations):
+    start = time.perf_counter()
+    block(iterations)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def bare(iterations):
+    for _ in range(iterations):
+        pass
+
+
+def timed(iterations):
+    timer = metrics.timer
+    for _ in range(iterations):
+        with timer('ash_benchmark_seconds', stage='noop'):
+            pass
+
+
+def timer_overhead(iterations):
+    """Cost of one timed block, disabled and enabled, minus the bare loop"""
+    loop = per_call_ns(bare, iterations)
+    metrics.registry.set_enabled(False)
+    disabled = per_call_ns(timed, iterations) - loop
+    metrics.registry.set_enabled(True)
+    enabled = per_call_ns(timed, iterations) - loop
+    metrics.registry.reset()
+    return {'disabled_ns': round(disabled, 1), 'enabled_ns': round(enabled, 1)}
+
+
+def classify_overhead(size):
+    """classify_input throughput with metrics off and on"""
+    from Processing.nlp_processor import NLPProcessor
+    from Processing.analysis_cache import AnalysisCache
+    from Testing.nlp_benchmark import build_corpus
+
+    nlp = NLPProcessor(cache=AnalysisCache(maxsize=0),
+                       classification_cache=AnalysisCache(maxsize=0))
+    texts = [item['text'] for item in build_corpus(nlp.system_commands)][:size]
+    nlp.classify_input(texts[0])
+
+    result = {}
+    for enabled in (False, True, False, True):
+        metrics.registry.set_enabled(enabled)
+        start = time.perf_counter()
+        for text in texts:
+            nlp.classify_input(text)
+        elapsed = time.perf_counter() - start
+        # Keep the faster of the two runs for each setting
+        key = 'enabled_ms' if enabled else 'disabled_ms'
+        per_call = round(elapsed / len(texts) * 1000, 4)
+        result[key] = min(result.get(key, per_call), per_call)
+    metrics.registry.set_enabled(False)
+    result['overhead_pct'] = round(
+        (result['enabled_ms'] / result['disabled_ms'] - 1) * 100, 2
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of the stage timing hooks")
+    parser.add_argument('--iterations', type=int, default=1000000)
+    parser.add_argument('--size', type=int, default=500,
+                        help="utterances for the classify_input comparison")
+    parser.add_argument('--skip-classify', action='store_true',
+                        help="only measure the timer itself (no spaCy needed)")
+    args = parser.parse_args()
+
+    report = {'timer': timer_overhead(args.iterations)}
+    if not args.skip_classify:
+        report['classify_input'] = classify_overhead(args.size)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from Processing.nlp_processor import NLPProcessor
+from Processing.analysis_cache import AnalysisCache
+
+# Wrappers that keep the command intact. Statement-like wrappers ("i want
+# to {}", "{} right now", "go ahead and {}") are left out: they are not
+# commands as such, yet fuzzy matching still takes some of them for one,
+# so neither label would be right.
+COMMAND_TEMPLATES = [
+    "{}", "please {}", "{} please", "can you {}", "could you {}",
+    "{} now", "ash {}", "hey ash {}", "{} for me",
+    "can you please {}", "just {}"
+]
+
+APP_NAMES = ['chrome', 'firefox', 'notepad', 'calculator', 'spotify',
+             'vscode', 'terminal', 'discord', 'word', 'excel']
+
+QUESTION_TEMPLATES = [
+    "what is {}", "what is {}?", "explain {}", "how does {} work",
+    "why is {} important", "tell me about {}", "describe {}",
+    "who invented {}", "can you explain {} to me", "write a poem about {}",
+    "tell me a joke about {}", "how do i learn {}"
+]
+
+TOPICS = ['python', 'machine learning', 'the internet', 'black holes',
+          'photosynthesis', 'recursion', 'the roman empire', 'coffee',
+          'neural networks', 'climate change', 'linux', 'quantum computing',
+          'cats', 'the moon', 'electricity', 'databases', 'music theory',
+          'chess', 'volcanoes', 'democracy']
+
+# Ordinary sentences a word away from a command, e.g. "quiz" from "quit".
+# Spelling correction must leave them alone; any label but system is right.
+NEAR_COMMANDS = [
+    "quiz me on history", "clone my git repo", "shop for shoes online",
+    "star wars facts", "is that right", "do it now", "turn on the lights"
+]
+
+
+def add_typo(text, rng):
+    """Swap two adjacent letters inside one word, like a misheard word"""
+    words = text.split()
+    candidates = [i for i, word in enumerate(words) if len(word) > 3]
+    if not candidates:
+        return text
+    i = rng.choice(candidates)
+    word = words[i]
+    j = rng.randrange(1, len(word) - 2)
+    words[i] = word[:j] + word[j + 1] + word[j] + word[j + 2:]
+    return ' '.join(words)
+
+
+def build_corpus(system_commands, seed=0, typo_rate=0.2):
+    """Labeled utterances covering every command category plus questions"""
+    rng = random.Random(seed)
+    corpus = []
+
+    # Commands listed under several categories have no single right label
+    owners = defaultdict(set)
+    for category, commands in system_commands.items():
+        for cmd in commands:
+            owners[cmd].add(category)
+
+    for category, commands in system_commands.items():
+        for cmd in commands:
+            if len(owners[cmd]) > 1:
+                continue
+            phrases = [cmd]
+            if category == 'app':
+                phrases = [f"{cmd} {app}" for app in rng.sample(APP_NAMES, 3)]
+            for phrase in phrases:
+                for template in COMMAND_TEMPLATES:
+                    text = template.format(phrase)
+                    if rng.random() < typo_rate:
+                        text = add_typo(text, rng)
+                    corpus.append({
+                        'text': text,
+                        'type': 'system',
+                        'category': category
+                    })
+
+    for template in QUESTION_TEMPLATES:
+        for topic in TOPICS:
+            corpus.append({
+                'text': template.format(topic),
+                'type': 'generation',
+                'category': None
+            })
+
+    for text in NEAR_COMMANDS:
+        corpus.append({
+            'text': text,
+            'type': 'not_system',
+            'category': None
+        })
+
+    rng.shuffle(corpus)
+    return corpus
+
+
+def load_corpus(path):
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_corpus(corpus, path):
+    with open(path, 'w') as f:
+        for item in corpus:
+            f.write(json.dumps(item) + '\n')
+
+
+def percentile(sorted_values, fraction):
+    """Linearly interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    weight = position - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def summarize(latencies, items):
+    """Latency percentiles in ms and throughput for one benchmark target"""
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'samples': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 4),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 4),
+        'mean_ms': round(total / len(latencies) * 1000, 4) if latencies else 0.0,
+        'utterances_per_s': round(items / total, 2) if total else 0.0
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KB, macOS reports bytes
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 2)
+    except ImportError:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 2)
+
+
+def is_correct(item, classification):
+    if item['type'] == 'not_system':
+        return classification['type'] != 'system'
+    if classification['type'] != item['type']:
+        return False
+    return item['type'] != 'system' or classification.get('category') == item['category']
+
+
+def bench_classify(nlp, corpus):
+    latencies = []
+    correct = 0
+    per_category = defaultdict(lambda: {'total': 0, 'correct': 0})
+    tiers = defaultdict(int)
+    for item in corpus:
+        start = time.perf_counter()
+        classification = nlp.classify_input(item['text'])
+        latencies.append(time.perf_counter() - start)
+        tiers[f"tier{classification.get('tier')}"] += 1
+
+        label = item['category'] or item['type']
+        per_category[label]['total'] += 1
+        if is_correct(item, classification):
+            correct += 1
+            per_category[label]['correct'] += 1
+
+    report = summarize(latencies, len(corpus))
+    report['accuracy'] = round(correct / len(corpus), 4)
+    report['accuracy_by_label'] = {
+        label: round(counts['correct'] / counts['total'], 4)
+        for label, counts in sorted(per_category.items())
+    }
+    report['tiers'] = dict(sorted(tiers.items()))
+    return report
+
+
+def bench_preprocess(nlp, corpus):
+    latencies = []
+    for item in corpus:
+        start = time.perf_counter()
+        nlp.preprocess_text(item['text'])
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies, len(corpus))
+
+
+def bench_batch(nlp, corpus, batch_size):
+    texts = [item['text'] for item in corpus]
+    latencies = []
+    for i in range(0, len(texts), batch_size):
+        batch = texts[i:i + batch_size]
+        start = time.perf_counter()
+        nlp.batch_process(batch, batch_size=batch_size)
+        latencies.append(time.perf_counter() - start)
+    report = summarize(latencies, len(texts))
+    report['batch_size'] = batch_size
+    return report
+
+
+def git_commit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(report, baseline, tolerance):
+    """List regressions of report against baseline beyond tolerance"""
+    regressions = []
+    # Accuracy over a different corpus is not comparable
+    same_corpus = report.get('corpus_size') == baseline.get('corpus_size')
+    for target, stats in report['results'].items():
+        base = baseline.get('results', {}).get(target)
+        if not base:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if metric in stats and base.get(metric) and stats[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{target}.{metric}: {base[metric]} -> {stats[metric]}")
+        if 'utterances_per_s' in stats and base.get('utterances_per_s') and \
+                stats['utterances_per_s'] < base['utterances_per_s'] * (1 - tolerance):
+            regressions.append(
+                f"{target}.utterances_per_s: {base['utterances_per_s']} -> {stats['utterances_per_s']}"
+            )
+        if same_corpus and 'accuracy' in stats and 'accuracy' in base and \
+                stats['accuracy'] < base['accuracy']:
+            regressions.append(f"{target}.accuracy: {base['accuracy']} -> {stats['accuracy']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NLP latency, throughput and accuracy benchmark")
+    parser.add_argument('--corpus', help="labeled JSONL corpus (default: generated)")
+    parser.add_argument('--write-corpus', help="write the generated corpus to this path and exit")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--matcher', default='index', help="command matcher: index or vector")
+    parser.add_argument('--preprocessor', default='nltk', help="token source: nltk or spacy")
+    parser.add_argument('--cache', action='store_true',
+                        help="keep the analysis and classification caches enabled")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="baseline JSON report to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="allowed relative slowdown before flagging a regression")
+    args = parser.parse_args()
+
+    # Caches are off by default so every utterance pays the full cost
+    cache_options = {} if args.cache else {
+        'cache': AnalysisCache(maxsize=0),
+        'classification_cache': AnalysisCache(maxsize=0)
+    }
+
+    start = time.perf_counter()
+    nlp = NLPProcessor(matcher=args.matcher, preprocessor=args.preprocessor, **cache_options)
+    startup_s = time.perf_counter() - start
+
+    corpus = load_corpus(args.corpus) if args.corpus else build_corpus(nlp.system_commands, args.seed)
+    if args.write_corpus:
+        write_corpus(corpus, args.write_corpus)
+        print(f"Wrote {len(corpus)} utterances to {args.write_corpus}")
+        return
+
+    # One untimed pass so lazy model state is warm for every target
+    nlp.classify_input(corpus[0]['text'])
+
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'corpus_size': len(corpus),
+        'cache_enabled': args.cache,
+        'matcher': args.matcher,
+        'preprocessor': args.preprocessor,
+        'startup_s': round(startup_s, 3),
+        'results': {
+            'classify_input': bench_classify(nlp, corpus),
+            'preprocess_text': bench_preprocess(nlp, corpus),
+            'batch_process': bench_batch(nlp, corpus, args.batch_size)
+        }
+    }
+    report['peak_rss_mb'] = peak_rss_mb()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print("No regressions against baseline", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import shlex
+import time
+
+from Processing.ollama_client import OllamaClient, OllamaCLI
+from Processing.generation_handler import Conversation
+from Testing.fake_ollama_server import FakeOllamaServer
+from Testing.nlp_benchmark import summarize
+
+FAKE_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_ollama_cli.py')
+
+PROMPT = "Human: what is python?\n\nAssistant: "
+
+
+def bench(client, requests):
+    """Per-request latency of client.generate, after one warm-up call"""
+    client.generate(PROMPT)
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client.generate(PROMPT)
+        latencies.append(time.perf_counter() - start)
+    report = summarize(latencies, requests)
+    report['requests_per_s'] = report.pop('utterances_per_s')
+    return report
+
+
+def bench_stream(client, requests):
+    """Time to the first streamed piece of text and to the whole answer"""
+    first, total = [], []
+    for _ in range(requests):
+        start = time.perf_counter()
+        first_seen = None
+        for chunk in client.generate_stream(PROMPT):
+            if chunk.get('response') and first_seen is None:
+                first_seen = time.perf_counter() - start
+        first.append(first_seen or 0.0)
+        total.append(time.perf_counter() - start)
+    return {
+        'first_token_p50_ms': summarize(first, requests)['p50_ms'],
+        'complete_p50_ms': summarize(total, requests)['p50_ms']
+    }
+
+
+def bench_conversation(client, turns):
+    """Prompt tokens evaluated per turn of one chat, reusing context tokens or resending text"""
+    results = {}
+    for mode, max_tokens in (('context', 4096), ('transcript', 0)):
+        chat = Conversation(max_turns=turns, max_context_tokens=max_tokens)
+        evaluated = []
+        for i in range(turns):
+            turn = chat.turn_text(f"tell me more about point {i}")
+            prompt, system, tokens = chat.request(turn)
+            result = client.generate(prompt, system=system, context=tokens)
+            evaluated.append(result.get('prompt_eval_count', 0))
+            chat.record(turn, result.get('response', ''), result.get('context'))
+        results[mode] = {'first_turn': evaluated[0], 'last_turn': evaluated[-1]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Per-request overhead of the HTTP client versus spawning the ollama CLI"
+    )
+    parser.add_argument('--requests', type=int, default=50, help="requests per backend")
+    parser.add_argument('--host', default=None,
+                        help="benchmark a running Ollama server instead of the fake one")
+    parser.add_argument('--cli', default=None,
+                        help="CLI command to benchmark, e.g. 'ollama' (default: the fake CLI)")
+    parser.add_argument('--model', default='llama3.2')
+    parser.add_argument('--token-delay', type=float, default=0.02,
+                        help="seconds between words the fake server streams")
+    parser.add_argument('--stream-requests', type=int, default=5,
+                        help="streamed requests over HTTP (0 to skip)")
+    parser.add_argument('--turns', type=int, default=5,
+                        help="turns of the conversation measured over HTTP (0 to skip)")
+    args = parser.parse_args()
+
+    # Both fakes answer non-streamed requests instantly, so those numbers
+    # are pure transport overhead
+    server = None
+    host = args.host
+    if host is None:
+        server = FakeOllamaServer(token_delay=args.token_delay).start()
+        host = server.url
+    cli_command = shlex.split(args.cli) if args.cli else [sys.executable, FAKE_CLI]
+
+    http_client = OllamaClient(host=host, model=args.model)
+    cli_client = OllamaCLI(model=args.model, command=cli_command)
+    try:
+        results = {
+            'http': bench(http_client, args.requests),
+            'cli': bench(cli_client, args.requests)
+        }
+        if args.stream_requests:
+            results['http_stream'] = bench_stream(http_client, args.stream_requests)
+        if args.turns:
+            results['http_conversation'] = bench_conversation(http_client, args.turns)
+    finally:
+        http_client.close()
+        if server is not None:
+            server.stop()
+
+    results['http_speedup_p50'] = round(
+        results['cli']['p50_ms'] / results['http']['p50_ms'], 1
+    ) if results['http']['p50_ms'] else 0
+    print(json.dumps({
+        'host': host,
+        'cli': ' '.join(cli_command),
+        'requests': args.requests,
+        'results': results
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import tempfile
+import traceback
+
+from Processing.generation_handler import GenerationHandler, ResponseFormatter
+from Processing.learning_store import LearningStore
+
+# Pieces of model output that exercise markers, artifact lines and whitespace
+OUTPUT_PIECES = ['<<SYS>>', '<</SYS>>', '<<SY', '<</', 'SYS>>', '<', '/', 'S', '>',
+                 'Human:', 'Assistant:', 'ssistant: ', 'System', ':', 'ok', 'a',
+                 ' ', '  ', '\t', '\n', '\n\n']
+
+
+def check_learned_command_keeps_statements_apart(workdir):
+    """Learning that "sleep" works must not make "i want to sleep" a command"""
+    from Processing.nlp_processor import NLPProcessor, pattern_key
+
+    assert pattern_key("i want to sleep") != pattern_key("sleep")
+    assert pattern_key("hey ash, sleep please") == pattern_key("sleep")
+
+    nlp = NLPProcessor(
+        offline=True,
+        lazy=True,
+        preprocessor='spacy',
+        learning_store=LearningStore(os.path.join(workdir, "learning.json"))
+    )
+    for _ in range(3):
+        nlp.provide_feedback("sleep", True)
+    result = nlp.classify_input("i want to sleep")
+    assert result['type'] != 'system', result
+
+
+def check_streamed_formatting_matches_whole(workdir, cases=20000, seed=1):
+    """ResponseFormatter, fed in random pieces, equals _format_response"""
+    handler = GenerationHandler(client=object())
+    rng = random.Random(seed)
+    for _ in range(cases):
+        text = ''.join(rng.choice(OUTPUT_PIECES) for _ in range(rng.randint(0, 12)))
+        cuts = sorted(rng.sample(range(len(text) + 1), min(len(text) + 1, rng.randint(0, 4))))
+        formatter = ResponseFormatter()
+        streamed = ''.join(formatter.feed(text[start:end])
+                           for start, end in zip([0] + cuts, cuts + [len(text)]))
+        streamed += formatter.finish()
+        expected = handler._format_response(text)
+        assert streamed == expected, (text, cuts, streamed, expected)
+
+
+CHECKS = [
+    check_learned_command_keeps_statements_apart,
+    check_streamed_formatting_matches_whole
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks for behaviour fixed after review")
+    parser.add_argument('-k', default='', help="only run checks whose name contains this")
+    args = parser.parse_args()
+
+    failures = 0
+    for check in CHECKS:
+        if args.k not in check.__name__:
+            continue
+        # Files the processor writes (learning data, spelling index) stay out of the tree
+        with tempfile.TemporaryDirectory() as workdir:
+            cwd = os.getcwd()
+            os.chdir(workdir)
+            try:
+                check(workdir)
+                print(f"ok    {check.__name__}")
+            except Exception:
+                failures += 1
+                print(f"FAIL  {check.__name__}")
+                traceback.print_exc()
+            finally:
+                os.chdir(cwd)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import sys
+import os
+import argparse
+import json
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each step runs in a fresh interpreter: (setup code, timed code).
+# Import and model-load costs are only visible in a cold process.
+STEPS = {
+    'import nlp_processor': (
+        "",
+        "import Processing.nlp_processor"
+    ),
+    'import nltk': (
+        "",
+        "import nltk"
+    ),
+    'nltk resource check': (
+        "from Processing.nlp_processor import NLTK_RESOURCES, ensure_nltk_resource",
+        "[ensure_nltk_resource(name, offline=True) for name in NLTK_RESOURCES]"
+    ),
+    'nltk stopwords': (
+        "from nltk.corpus import stopwords",
+        "set(stopwords.words('english'))"
+    ),
+    'nltk wordnet lemmatizer': (
+        "from nltk.stem import WordNetLemmatizer",
+        "WordNetLemmatizer().lemmatize('tests')"
+    ),
+    'import spacy': (
+        "",
+        "import spacy"
+    ),
+    'spacy load (full)': (
+        "import spacy",
+        "spacy.load('en_core_web_sm')"
+    ),
+    'spacy load (trimmed)': (
+        "import spacy\n"
+        "from Processing.nlp_processor import UNUSED_SPACY_PIPES",
+        "spacy.load('en_core_web_sm', disable=list(UNUSED_SPACY_PIPES))"
+    ),
+    'spell checker': (
+        "from spellchecker import SpellChecker",
+        "SpellChecker()"
+    ),
+    'NLPProcessor (eager)': (
+        "from Processing.nlp_processor import NLPProcessor",
+        "NLPProcessor(offline=True)"
+    ),
+    'NLPProcessor (lazy, trimmed)': (
+        "from Processing.nlp_processor import NLPProcessor",
+        "NLPProcessor(offline=True, lazy=True, trim_pipeline=True)"
+    ),
+    'first classify (lazy, trimmed)': (
+        "from Processing.nlp_processor import NLPProcessor\n"
+        "nlp = NLPProcessor(offline=True, lazy=True, trim_pipeline=True)",
+        "nlp.classify_input('volume up')"
+    )
+}
+
+TEMPLATE = """
+import sys, time
+sys.path.insert(0, {root!r})
+{setup}
+start = time.perf_counter()
+{timed}
+print(time.perf_counter() - start)
+"""
+
+
+def time_step(setup, timed):
+    """Run one step in a fresh interpreter and return its duration in seconds"""
+    code = TEMPLATE.format(root=ROOT, setup=setup, timed=timed)
+    result = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, cwd=ROOT
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def run(repeat):
+    """Time every step, returning {step: stats} with times in milliseconds"""
+    report = {}
+    for name, (setup, timed) in STEPS.items():
+        try:
+            samples = [time_step(setup, timed) * 1000 for _ in range(repeat)]
+        except RuntimeError as e:
+            report[name] = {'error': str(e)}
+            continue
+        report[name] = {
+            'median_ms': round(statistics.median(samples), 2),
+            'min_ms': round(min(samples), 2),
+            'max_ms': round(max(samples), 2)
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure NLPProcessor startup cost per component")
+    parser.add_argument('--repeat', type=int, default=3, help="cold runs per step")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args.repeat)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"\n{'Component':<34}{'median ms':>12}{'min ms':>12}{'max ms':>12}")
+    print("-" * 70)
+    for name, stats in report.items():
+        if 'error' in stats:
+            print(f"{name:<34}  error: {stats['error']}")
+        else:
+            print(f"{name:<34}{stats['median_ms']:>12}{stats['min_ms']:>12}{stats['max_ms']:>12}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,9 @@
 import speech_recognition as sr
 from Processing.nlp_processor import NLPProcessor
 from Processing.system_commands import SystemCommandExecutor
-from Processing.generation_handler import GenerationHandler
+from Processing.generation_handler import GenerationHandler, iter_sentences
 import pyttsx3
+import queue
 import threading
 
 class VoiceCommander:
@@ -19,6 +20,68 @@ class VoiceCommander:
         self.engine.say(text)
         self.engine.runAndWait()
     
+    def speak_stream(self, chunks):
+        """Speak streamed text one sentence at a time; returns the whole text.
+        
+        The stream is read on a background thread, so the next sentence is
+        generated while the current one is spoken. The speech engine stays
+        on this thread.
+        """
+        sentences = queue.Queue()
+        parts = []
+        
+        def collect():
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        
+        def read():
+            try:
+                for sentence in iter_sentences(collect()):
+                    sentences.put(sentence)
+            finally:
+                sentences.put(None)
+        
+        threading.Thread(target=read, daemon=True).start()
+        while True:
+            sentence = sentences.get()
+            if sentence is None:
+                break
+            print(sentence)
+            self.speak(sentence)
+        return ''.join(parts)
+    
+    def handle_command(self, command, classification):
+        """Run or answer a classified command and speak the result"""
+        if classification['type'] == 'system':
+            print(f"Executing: {classification['command']}")
+            self.speak(f"Executing {classification['command']}")
+
+            result = self.cmd_executor.execute_command(
+                classification['category'],
+                classification['command']
+            )
+            print(f"Result: {result}")
+            self.speak(result)
+
+        elif classification['type'] == 'generation':
+            print(f"Processing question: {command}")
+            self.speak("Let me think about that")
+
+            print("Response:")
+            self.speak_stream(self.generator.stream_specific_queries(
+                classification['intent'],
+                command
+            ))
+
+        else:
+            suggestions = [f"{s['category']}: {s['command']}" 
+                         for s in classification['suggestions']]
+            response = "I'm not sure what you want. Did you mean: " + \
+                     " or ".join(suggestions)
+            print(response)
+            self.speak(response)
+
     def listen(self):
         """Listen for voice commands"""
         with sr.Microphone() as source:
@@ -45,37 +108,7 @@ class VoiceCommander:
                     
                     # Process the command
                     classification = self.nlp.classify_input(command)
-                    
-                    if classification['type'] == 'system':
-                        print(f"Executing: {classification['command']}")
-                        self.speak(f"Executing {classification['command']}")
-                        
-                        result = self.cmd_executor.execute_command(
-                            classification['category'],
-                            classification['command']
-                        )
-                        print(f"Result: {result}")
-                        self.speak(result)
-                        
-                    elif classification['type'] == 'generation':
-                        print(f"Processing question: {command}")
-                        self.speak("Let me think about that")
-                        
-                        response = self.generator.handle_specific_queries(
-                            classification['intent'],
-                            command
-                        )
-                        
-                        print(f"Response: {response}")
-                        self.speak(response)
-                        
-                    else:
-                        suggestions = [f"{s['category']}: {s['command']}" 
-                                     for s in classification['suggestions']]
-                        response = "I'm not sure what you want. Did you mean: " + \
-                                 " or ".join(suggestions)
-                        print(response)
-                        self.speak(response)
+                    self.handle_command(command, classification)
                     
                 except sr.UnknownValueError:
                     print("Could not understand audio")
@@ -87,6 +120,41 @@ class VoiceCommander:
                     print(f"Error: {e}")
                     self.speak("An error occurred")
 
+    def listen_streaming(self, transcripts):
+        """Act on commands from a streaming recognizer as they are spoken.
+        
+        transcripts yields the partial transcript of the current utterance
+        each time it grows (e.g. Vosk's PartialResult), and None when the
+        utterance ends. Unambiguous device commands such as "mute" run as
+        soon as they are recognized instead of after the trailing silence.
+        """
+        classifier = self.nlp.incremental()
+        command = ''
+        acted = False
+        
+        for partial in transcripts:
+            if partial is None:
+                # End of utterance
+                if command in ['stop listening', 'exit', 'quit', 'bye']:
+                    self.speak("Stopping voice commands")
+                    break
+                if not acted and command:
+                    print(f"\nYou said: {command}")
+                    self.handle_command(command, classifier.finalize(command))
+                else:
+                    classifier.reset()
+                command = ''
+                acted = False
+                continue
+            
+            command = partial.lower()
+            if not acted:
+                decision = classifier.feed(command)
+                if decision:
+                    print(f"\nYou said: {decision['text']} (early)")
+                    self.handle_command(decision['text'], decision)
+                    acted = True
+
 def main():
     print("Voice Command System")
     print("-------------------")
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import time
+
+from Processing.nlp_processor import NLPProcessor
+from Processing.analysis_cache import AnalysisCache
+from Processing.worker_pool import ClassificationPool, fork_available
+from Testing.nlp_benchmark import build_corpus, peak_rss_mb
+
+
+def run(pool, texts, window):
+    """Classify texts keeping at most window requests in flight"""
+    start = time.perf_counter()
+    in_flight = []
+    for text in texts:
+        if len(in_flight) >= window:
+            in_flight.pop(0).result()
+        in_flight.append(pool.submit(text))
+    for future in in_flight:
+        future.result()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classification throughput by worker count")
+    parser.add_argument('--workers', default=None,
+                        help="comma-separated worker counts (default: 0,1,2,4,... up to the cores)")
+    parser.add_argument('--size', type=int, default=1000, help="utterances per run")
+    parser.add_argument('--json', action='store_true', help="print results as JSON")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    if args.workers:
+        counts = [int(n) for n in args.workers.split(',')]
+    else:
+        counts = [0] + [n for n in (1, 2, 4, 8, 16, 32) if n <= cores]
+        if cores not in counts:
+            counts.append(cores)
+
+    # No classification cache, so every utterance is really classified
+    nlp = NLPProcessor(classification_cache=AnalysisCache(maxsize=0))
+    texts = [item['text'] for item in build_corpus(nlp.system_commands)][:args.size]
+
+    results = []
+    for count in counts:
+        if count > 0 and not fork_available():
+            continue
+        pool = ClassificationPool(nlp, workers=count, max_pending=4 * max(count, 1))
+        # Warm every worker before timing
+        run(pool, texts[:4 * max(count, 1)], pool.max_pending)
+        elapsed = run(pool, texts, pool.max_pending)
+        pool.close()
+        results.append({
+            'workers': count,
+            'seconds': round(elapsed, 3),
+            'utterances_per_s': round(len(texts) / elapsed, 1)
+        })
+
+    baseline = results[0]['utterances_per_s'] if results else 0
+    for result in results:
+        result['speedup'] = round(result['utterances_per_s'] / baseline, 2) if baseline else 0
+
+    report = {'cores': cores, 'utterances': len(texts),
+              'parent_peak_rss_mb': peak_rss_mb(), 'results': results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"{len(texts)} utterances, {cores} cores (0 workers = in-process)")
+    for result in results:
+        print(f"  {result['workers']:>3} workers  {result['utterances_per_s']:>9.1f} utt/s  "
+              f"x{result['speedup']}")
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,99 @@
-from flask import Flask, render_template, request, jsonify
-from Processing.nlp_processor import NLPProcessor
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from Processing.nlp_processor import NLPProcessor, CLASSIFY_METRIC
 from Processing.system_commands import SystemCommandExecutor
 from Processing.generation_handler import GenerationHandler
+from Processing.generation_jobs import GenerationQueue
+from Processing.response_cache import ResponseCache
+from Processing.analysis_cache import shared_cache
+from Processing.worker_pool import ClassificationPool
+from Processing.command_grammar import GrammarWatcher
+from Processing import metrics
 import psutil
+import json
+import os
+import queue
 from datetime import datetime
 
 app = Flask(__name__)
 
-# Initialize our components
-nlp = NLPProcessor()
+# Initialize our components. ASH_OFFLINE=1 never downloads NLTK data and
+# ASH_LAZY_LOAD=1 defers loading the models until the first request.
+# ASH_MATCHER=vector scores commands with TF-IDF matrix products.
+# ASH_PREPROCESSOR=nltk brings back NLTK/WordNet tokens and lemmas.
+nlp = NLPProcessor(
+    offline=os.environ.get('ASH_OFFLINE') == '1',
+    lazy=os.environ.get('ASH_LAZY_LOAD') == '1',
+    trim_pipeline=True,
+    cache=shared_cache(),
+    matcher=os.environ.get('ASH_MATCHER', 'index'),
+    preprocessor=os.environ.get('ASH_PREPROCESSOR', 'spacy')
+)
+
+# ASH_METRICS=0 starts with stage timing off; toggle it with POST /metrics.
+# Set before forking so workers start in the same state.
+metrics.registry.set_enabled(os.environ.get('ASH_METRICS', '1') == '1')
+
+# ASH_WORKERS=N classifies /process requests in N pre-forked processes that
+# share the loaded models; ASH_MAX_PENDING bounds the requests queued for them.
+workers = int(os.environ.get('ASH_WORKERS', '0'))
+pool = ClassificationPool(
+    nlp,
+    workers=workers,
+    max_pending=int(os.environ.get('ASH_MAX_PENDING', '64'))
+) if workers > 0 else None
+
+# A worker that dies takes its request with it; give up after this long
+classify_timeout = float(os.environ.get('ASH_CLASSIFY_TIMEOUT', '10'))
+
+def grammar_reloaded(grammar):
+    # Workers hold a copy of the grammar from fork time
+    if pool is not None:
+        pool.restart()
+
+# ASH_GRAMMAR_WATCH=1 reloads Processing/command_grammar.json when it changes
+if os.environ.get('ASH_GRAMMAR_WATCH') == '1':
+    GrammarWatcher(nlp, on_reload=grammar_reloaded).start()
+
+# Answers are cached on disk in ASH_RESPONSE_CACHE (default nlp_responses.sqlite3;
+# 0 turns it off). ASH_RESPONSE_CACHE_SIMILARITY=0.8 also serves near-duplicates.
+cache_path = os.environ.get('ASH_RESPONSE_CACHE', 'nlp_responses.sqlite3')
+similarity = os.environ.get('ASH_RESPONSE_CACHE_SIMILARITY')
+response_cache = ResponseCache(
+    cache_path,
+    similarity=float(similarity) if similarity else None
+) if cache_path != '0' else None
+
 cmd_executor = SystemCommandExecutor()
-generator = GenerationHandler()
+generator = GenerationHandler(cache=shared_cache(), response_cache=response_cache)
+
+# Answers are generated by ASH_GENERATION_WORKERS background threads (the most
+# model calls run at once); ASH_GENERATION_QUEUE more may wait, and beyond
+# that requests get 429 with Retry-After. Commands never wait for them.
+jobs = GenerationQueue(
+    generator,
+    workers=int(os.environ.get('ASH_GENERATION_WORKERS', '2')),
+    max_queued=int(os.environ.get('ASH_GENERATION_QUEUE', '16'))
+)
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/process', methods=['POST'])
-def process_command():
-    user_input = request.json.get('command', '')
-    
-    # Process the input
-    classification = nlp.classify_input(user_input)
+def build_response(user_input, classification, conversation=None):
+    """Run the handler for a classification and build the JSON response.
     
+    Generation waits for its job; raises queue.Full when the job queue is.
+    """
+    response, job = start_response(user_input, classification, conversation)
+    if job is not None:
+        finish_response(response, job)
+    return response
+
+def start_response(user_input, classification, conversation=None):
+    """Like build_response, but returns (response, job) without waiting for the job"""
     response = {
         'type': classification['type'],
-        'confidence': classification['confidence'],
+        'confidence': classification.get('confidence', 0.0),
         'result': ''
     }
     
@@ -38,16 +106,223 @@ def process_command():
         response['category'] = classification['category']
         
     elif classification['type'] == 'generation':
-        response['result'] = generator.handle_specific_queries(
-            classification['intent'],
-            user_input
-        )
+        return response, jobs.submit(classification['intent'], user_input, conversation)
         
     else:
         response['result'] = "Unclear command. Please try again."
         response['suggestions'] = classification['suggestions']
     
-    return jsonify(response)
+    return response, None
+
+def finish_response(response, job):
+    job.wait()
+    response['result'] = job.text
+    return response
+
+def classify(user_input):
+    """Classify in the worker pool when there is one.
+
+    Raises queue.Full when the pool is saturated or no worker answers
+    within ASH_CLASSIFY_TIMEOUT seconds.
+    """
+    if pool is not None:
+        # Workers send their stage timings back with each result; this
+        # adds the round trip as seen from here
+        with metrics.timer(CLASSIFY_METRIC, stage='worker_roundtrip'):
+            try:
+                return pool.classify(user_input, timeout=classify_timeout)
+            except TimeoutError as e:
+                raise queue.Full(str(e)) from e
+    return nlp.classify_input(user_input)
+
+def busy_response():
+    response = jsonify({'error': 'Server busy, please retry'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def jobs_full_response():
+    retry_after = jobs.retry_after()
+    response = jsonify({'error': 'Too many answers being generated, please retry',
+                        'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+@app.route('/process', methods=['POST'])
+def process_command():
+    user_input = request.json.get('command', '')
+    # Requests sharing a "conversation" id continue one chat with the model
+    conversation = request.json.get('conversation')
+    
+    # Process the input
+    try:
+        classification = classify(user_input)
+    except queue.Full:
+        return busy_response()
+    
+    # "async": true answers a generation at once with its job, to poll at
+    # GET /jobs/<id> or follow at GET /jobs/<id>/events
+    if classification['type'] == 'generation' and request.json.get('async'):
+        try:
+            job = jobs.submit(classification['intent'], user_input, conversation)
+        except queue.Full:
+            return jobs_full_response()
+        return jsonify(dict(job.to_dict(), confidence=classification.get('confidence', 0.0))), 202
+    
+    try:
+        return jsonify(build_response(user_input, classification, conversation))
+    except queue.Full:
+        return jobs_full_response()
+
+def sse(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/process_stream', methods=['POST'])
+def process_stream():
+    # Generated answers arrive as "token" events while the model writes
+    # them; every request ends with a "result" event holding the /process body
+    user_input = request.json.get('command', '')
+    conversation = request.json.get('conversation')
+    try:
+        classification = classify(user_input)
+    except queue.Full:
+        return busy_response()
+    
+    if classification['type'] != 'generation':
+        return event_stream(iter([sse('result', build_response(user_input, classification))]))
+    
+    try:
+        job = jobs.submit(classification['intent'], user_input, conversation)
+    except queue.Full:
+        return jobs_full_response()
+    return event_stream(job_events(job, classification.get('confidence', 0.0)))
+
+def job_events(job, confidence=None):
+    """SSE for a job: its text so far and then as written, and a final "result" event"""
+    for text in job.follow(heartbeat=15):
+        # Comment lines keep proxies from closing a quiet connection
+        yield sse('token', {'text': text}) if text is not None else ": waiting\n\n"
+    result = job.to_dict()
+    if confidence is not None:
+        result['confidence'] = confidence
+    yield sse('result', result)
+
+def event_stream(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events')
+def job_stream(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return event_stream(job_events(job))
+
+@app.route('/admin/generation_jobs')
+def generation_jobs():
+    return jsonify(jobs.stats())
+
+MAX_BATCH_SIZE = 256
+
+@app.route('/process_batch', methods=['POST'])
+def process_batch():
+    commands = request.json.get('commands', [])
+    if not isinstance(commands, list) or not all(isinstance(c, str) for c in commands):
+        return jsonify({'error': "'commands' must be a list of strings"}), 400
+    
+    batch_size = request.json.get('batch_size', 32)
+    if isinstance(batch_size, bool) or not isinstance(batch_size, int) \
+            or not 1 <= batch_size <= MAX_BATCH_SIZE:
+        return jsonify({'error': f"'batch_size' must be an integer from 1 to {MAX_BATCH_SIZE}"}), 400
+    
+    # Classify everything in one nlp.pipe pass. Requests never fork extra
+    # parser processes; n_process is left to offline callers of classify_batch.
+    classifications = nlp.classify_batch(commands, batch_size=batch_size)
+    
+    # Only run handlers when asked to; offline replays just want the labels
+    if request.json.get('execute', False):
+        results = execute_batch(commands, classifications)
+    else:
+        results = [dict(cls, input=c) for c, cls in zip(commands, classifications)]
+    
+    return jsonify({'results': results})
+
+def execute_batch(commands, classifications):
+    """Handle a classified batch, generating its answers side by side.
+    
+    Every generation is queued before any command runs and waited for
+    only at the end. Ones the full queue turns away get an error and
+    retry_after in their own slot instead of failing the whole batch.
+    """
+    results = [None] * len(commands)
+    waiting = []
+    for i, (command, classification) in enumerate(zip(commands, classifications)):
+        if classification['type'] != 'generation':
+            continue
+        try:
+            waiting.append((i, start_response(command, classification)))
+        except queue.Full:
+            results[i] = {
+                'type': 'generation',
+                'confidence': classification.get('confidence', 0.0),
+                'error': 'Too many answers being generated, please retry',
+                'retry_after': jobs.retry_after()
+            }
+    
+    for i, (command, classification) in enumerate(zip(commands, classifications)):
+        if classification['type'] != 'generation':
+            results[i] = build_response(command, classification)
+    
+    for i, (response, job) in waiting:
+        results[i] = finish_response(response, job)
+    return results
+
+@app.route('/admin/reload_grammar', methods=['POST'])
+def reload_grammar():
+    start = datetime.now()
+    try:
+        grammar = nlp.reload_grammar()
+    except (OSError, ValueError) as e:
+        return jsonify({'error': str(e), 'version': nlp.grammar.version}), 400
+    grammar_reloaded(grammar)
+    
+    return jsonify({
+        'version': grammar.version,
+        'phrases': len(grammar),
+        'reload_ms': round((datetime.now() - start).total_seconds() * 1000, 1)
+    })
+
+@app.route('/admin/response_cache', methods=['GET', 'POST'])
+def response_cache_endpoint():
+    if response_cache is None:
+        return jsonify({'enabled': False})
+    # POST {"clear": true} drops every cached answer
+    if request.method == 'POST' and (request.json or {}).get('clear'):
+        response_cache.clear()
+    return jsonify(dict(response_cache.stats(), enabled=True))
+
+@app.route('/metrics', methods=['GET', 'POST'])
+def metrics_endpoint():
+    # POST {"enabled": false} switches timing off, {"reset": true} clears it
+    if request.method == 'POST':
+        options = request.json or {}
+        if 'enabled' in options:
+            metrics.registry.set_enabled(options['enabled'])
+        if options.get('reset'):
+            metrics.registry.reset()
+        return jsonify({'enabled': metrics.registry.enabled})
+    
+    if request.args.get('format') == 'json':
+        return jsonify(metrics.registry.to_dict())
+    return Response(metrics.registry.render_prometheus(),
+                    mimetype='text/plain; version=0.0.4')
 
 @app.route('/system_info')
 def system_info():